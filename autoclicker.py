@@ -1,19 +1,87 @@
+import sys
+import time
+
+_IMPORT_STARTED = time.perf_counter()  # Start of the cold-start timeline for --startup-profile
+
+# "autoclicker.py run ..." executes a saved script headlessly; dispatch before
+# the GUI imports below so the runner never loads tkinter, pystray or keyboard
+if __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] == 'run':
+    from runner import main
+    sys.exit(main(sys.argv[2:]))
+
+# keyboard, PIL, pystray and pyautogui are imported where first used, so none
+# of them delay the window appearing
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
-import pyautogui
-import keyboard
+from tkinter import ttk, messagebox, filedialog, colorchooser
+import argparse
 import json
+import queue
 import threading
-import time
-from typing import List, Optional, Dict, Any
-import pystray
-from PIL import Image, ImageDraw
-import sys
+from typing import List, Optional, Dict, Any, Iterable, Tuple
+from array import array
+import os
+
+from backends import BACKENDS, InjectionBackend, RecordingBackend, get_backend, get_default_backend
+from engine import (DEFAULT_SPIN_MS, PLAN_SETTINGS, REPEAT_MODES, REPEAT_ONCE, WAIT_CHANGE, WAIT_COLOR, CancelToken,
+                    ExecutionPlan, PlanRun, RunReport, optimization_blocker, run_blocking)
+from executor import OVERLAP_DROP, OVERLAP_POLICIES, ExecutorPool
+from hotkeys import HotkeyDispatcher, normalize_key
+from metrics import MetricsStore
+from recorder import ClickRecorder
+from stall import StallMonitor, install_callback_timing
+from storage import (PACK_EXTENSION, ChangeJournal, PackedScript, ScriptPack, atomic_write, columns_from_dict,
+                     read_library, write_pack)
+
+
+# Hotkey that cancels every running script and leaves run mode
+PANIC_HOTKEY = 'ctrl+alt+esc'
+
+# Where the autosave snapshot and change journal live
+AUTOSAVE_DIR = os.path.join(os.path.expanduser('~'), '.autoclicker')
+
+# Script settings that journal 'set' entries may change
+JOURNALED_SETTINGS = ('return_mouse', 'return_delay_ms', 'spin_ms', 'overlap_policy', 'queue_limit', 'backend_name',
+                      'repeat_mode', 'repeat_count', 'repeat_duration_ms', 'target_cps', 'priority',
+                      'optimize')
+
+# How often the live click rate of running scripts is redrawn
+RATE_REFRESH_MS = 250
+
+# How often clicks captured by the recorder are added to the script
+RECORD_COMMIT_MS = 100
+
+# Backend choices offered per script; 'default' uses the process-wide backend
+DEFAULT_BACKEND_CHOICE = 'default'
+BACKEND_CHOICES = (DEFAULT_BACKEND_CHOICE,) + tuple(name for name in BACKENDS if name != RecordingBackend.name)
+
+# How targets are shown while editing
+RENDER_WINDOWS = 'windows'  # One borderless Toplevel per target
+RENDER_OVERLAY = 'overlay'  # All targets of the edited script on one overlay
+
+
+class _PlanField:
+    """Attribute that invalidates the owning script's compiled plan when set."""
+    
+    def __set_name__(self, owner, name):
+        self.attr = '_' + name
+    
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return getattr(obj, self.attr)
+    
+    def __set__(self, obj, value):
+        setattr(obj, self.attr, value)
+        obj._plan_changed()
 
 
 class Target:
     """Represents a click target with position, delay, and visual indicator."""
     
+    x = _PlanField()
+    y = _PlanField()
+    delay_ms = _PlanField()
+    
     def __init__(self, parent, script, number: int, x: int = 100, y: int = 100, delay_ms: int = 500):
         self.parent = parent
         self.script = script
@@ -27,7 +95,9 @@ class Target:
         self.drag_start_x = 0
         self.drag_start_y = 0
         
-        self._create_window()
+        # In overlay mode the app's TargetOverlay draws the target instead
+        if getattr(parent, 'render_mode', RENDER_WINDOWS) == RENDER_WINDOWS:
+            self._create_window()
     
     def _create_window(self):
         """Create the target window with circular icon and number."""
@@ -68,6 +138,8 @@ class Target:
     
     def _draw_target(self):
         """Draw the circular target with number."""
+        if not self.canvas:
+            return
         self.canvas.delete('all')
         size = 50
         center = size // 2
@@ -82,6 +154,23 @@ class Target:
         self.canvas.create_text(center, center, text=str(self.number), 
                                font=('Arial', 16, 'bold'), fill='white')
     
+    def _plan_changed(self):
+        """Invalidate the script's compiled plan after a position or delay change."""
+        if self.script is not None:
+            self.script.invalidate_plan()
+    
+    def move_to(self, x: int, y: int):
+        """Set both coordinates as one edit, so no plan mixes the old x with the new y."""
+        script = self.script
+        if script is not None:
+            script._edits_in_progress += 1
+        try:
+            self.x = x
+            self.y = y
+        finally:
+            if script is not None:
+                script._edits_in_progress -= 1
+    
     def _on_click(self, event):
         """Handle mouse click for dragging."""
         if self.is_editing:
@@ -100,19 +189,23 @@ class Target:
             y = self.window.winfo_y() + dy
             
             # Update position
-            self.x = x + 25  # Center of window
-            self.y = y + 25
+            self.move_to(x + 25, y + 25)  # Center of window
             
             # Move window
             self.window.geometry(f'50x50+{x}+{y}')
     
     def _on_release(self, event):
         """Handle mouse release."""
-        pass
+        if self.is_editing:
+            on_moved = getattr(self.parent, '_on_target_moved', None)
+            if on_moved:
+                on_moved(self)
     
     def make_editable(self):
         """Make target editable and visible."""
         self.is_editing = True
+        if not self.window:
+            return
         # Show the window and make it fully visible
         self.window.deiconify()
         self.window.wm_attributes('-alpha', 1.0)  # Fully opaque
@@ -121,6 +214,8 @@ class Target:
     def make_readonly(self):
         """Make target read-only and completely invisible (click-through)."""
         self.is_editing = False
+        if not self.window:
+            return
         # Make completely invisible (0 opacity) and click-through
         self.window.wm_attributes('-alpha', 0.0)  # Completely transparent
         # Hide the window to make it truly click-through
@@ -150,31 +245,412 @@ class Target:
             self.window = None
 
 
+class TargetOverlay:
+    """One transparent, topmost window that draws and drags every target of the edited script."""
+    
+    SIZE = 50  # Target diameter, same as a target window
+    TRANSPARENT_COLOR = '#010203'  # Keyed out where the platform supports it
+    
+    def __init__(self, root, on_finish=None, on_move=None):
+        self.root = root
+        self.on_finish = on_finish  # Called on right-click or Escape to finish editing
+        self.on_move = on_move  # Called with a target once it has been dragged
+        self.window = None
+        self.canvas = None
+        self.script: Optional['Script'] = None
+        self._item_targets: Dict[int, Target] = {}
+        self._tags: Dict[int, str] = {}
+        self._drag_target: Optional[Target] = None
+        self._drag_start = self._drag_last = (0, 0)
+    
+    @staticmethod
+    def supported(root: tk.Misc) -> bool:
+        """Whether the overlay can let clicks through to other windows (needs -transparentcolor, Windows only)."""
+        try:
+            return 'transparentcolor' in str(root.wm_attributes())
+        except tk.TclError:
+            return False
+    
+    def _create_window(self):
+        """Create the screen-sized overlay window."""
+        self.window = tk.Toplevel(self.root)
+        self.window.overrideredirect(True)
+        self.window.wm_attributes('-topmost', True)
+        width, height = self.root.winfo_screenwidth(), self.root.winfo_screenheight()
+        self.window.geometry(f'{width}x{height}+0+0')
+        
+        try:
+            # Windows: only the target circles are visible and clickable
+            self.window.wm_attributes('-transparentcolor', self.TRANSPARENT_COLOR)
+        except tk.TclError:
+            # Other platforms: dim the screen while editing; the app is unreachable
+            # until editing ends, which is why it is only used when asked for
+            self.window.wm_attributes('-alpha', 0.6)
+        
+        self.canvas = tk.Canvas(self.window, width=width, height=height,
+                                bg=self.TRANSPARENT_COLOR, highlightthickness=0)
+        self.canvas.pack(fill='both', expand=True)
+        self.canvas.bind('<Button-1>', self._on_click)
+        self.canvas.bind('<B1-Motion>', self._on_drag)
+        self.canvas.bind('<ButtonRelease-1>', self._on_release)
+        # Where the overlay is not click-through it covers the main window
+        self.canvas.bind('<Button-3>', self._finish)
+        self.window.bind('<Escape>', self._finish)
+        self.window.protocol("WM_DELETE_WINDOW", lambda: None)
+    
+    def show(self, script: 'Script'):
+        """Show the targets of a script for editing."""
+        if self.window is None:
+            self._create_window()
+        self.script = script
+        self.redraw()
+        self.window.deiconify()
+        self.window.lift()
+        self.window.focus_force()
+    
+    def hide(self):
+        """Hide the overlay."""
+        self.script = None
+        self._drag_target = None
+        if self.window is not None:
+            self.window.withdraw()
+    
+    def redraw(self):
+        """Redraw every target of the edited script."""
+        if self.canvas is None:
+            return
+        self.canvas.delete('all')
+        self._item_targets.clear()
+        self._tags.clear()
+        if self.script is None:
+            return
+        
+        radius = self.SIZE // 2 - 5
+        for target in self.script.targets:
+            tag = f'target{id(target)}'
+            self._tags[id(target)] = tag
+            oval = self.canvas.create_oval(target.x - radius, target.y - radius,
+                                           target.x + radius, target.y + radius,
+                                           fill='red', outline='darkred', width=2, tags=(tag,))
+            text = self.canvas.create_text(target.x, target.y, text=str(target.number),
+                                           font=('Arial', 16, 'bold'), fill='white', tags=(tag,))
+            self._item_targets[oval] = target
+            self._item_targets[text] = target
+    
+    def _hit_test(self, x: int, y: int) -> Optional[Target]:
+        """Return the topmost target under a canvas point."""
+        for item in reversed(self.canvas.find_overlapping(x, y, x, y)):
+            target = self._item_targets.get(item)
+            if target is not None:
+                return target
+        return None
+    
+    def _on_click(self, event):
+        """Start dragging the target under the cursor."""
+        self._drag_target = self._hit_test(event.x, event.y)
+        self._drag_last = self._drag_start = (event.x, event.y)
+        if self._drag_target is not None:
+            self.canvas.tag_raise(self._tags[id(self._drag_target)])
+    
+    def _on_drag(self, event):
+        """Move the dragged target with the cursor."""
+        target = self._drag_target
+        if target is None:
+            return
+        dx = event.x - self._drag_last[0]
+        dy = event.y - self._drag_last[1]
+        self._drag_last = (event.x, event.y)
+        self.canvas.move(self._tags[id(target)], dx, dy)
+        target.move_to(target.x + dx, target.y + dy)
+    
+    def _on_release(self, event):
+        """Finish dragging."""
+        target, self._drag_target = self._drag_target, None
+        if target is not None and self._drag_last != self._drag_start and self.on_move:
+            self.on_move(target)
+    
+    def _finish(self, event=None):
+        """Ask the app to finish editing."""
+        if self.on_finish:
+            self.on_finish()
+
+
+class TargetTable:
+    """Virtualized table of a script's targets that only materializes the visible rows.
+    
+    The Treeview holds a fixed number of row slots; scrolling re-fills them from
+    the target list, so memory and render time do not grow with the script.
+    """
+    
+    VISIBLE_ROWS = 10
+    
+    def __init__(self, master, app: 'AutoclickerApp', script: 'Script'):
+        self.app = app
+        self.script = script
+        self.offset = 0  # Index of the first visible target
+        self._editor: Optional[tk.Entry] = None
+        
+        self.frame = tk.Frame(master)
+        self.tree = ttk.Treeview(self.frame, columns=('number', 'delay', 'position'), show='headings',
+                                 height=self.VISIBLE_ROWS, selectmode='extended')
+        self.tree.heading('number', text='#')
+        self.tree.heading('delay', text='Delay (ms)')
+        self.tree.heading('position', text='Position')
+        self.tree.column('number', width=60, anchor='e', stretch=False)
+        self.tree.column('delay', width=100, anchor='e', stretch=False)
+        self.tree.column('position', width=120, anchor='w')
+        self.scrollbar = ttk.Scrollbar(self.frame, orient='vertical', command=self._on_scrollbar)
+        self.tree.pack(side='left', fill='x', expand=True)
+        self.scrollbar.pack(side='left', fill='y')
+        
+        # Fixed row slots, re-filled on every refresh
+        self._slots = [self.tree.insert('', 'end', iid=f'slot{i}', values=('', '', ''))
+                       for i in range(self.VISIBLE_ROWS)]
+        self._shown = self.VISIBLE_ROWS
+        
+        self.tree.bind('<Double-1>', self._on_double_click)
+        self.tree.bind('<Delete>', lambda e: self.delete_selected())
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', lambda e: self._scroll_to(self.offset - 1))
+        self.tree.bind('<Button-5>', lambda e: self._scroll_to(self.offset + 1))
+        
+        buttons = tk.Frame(master)
+        tk.Button(buttons, text="Delete selected", command=self.delete_selected).pack(side='left', padx=5)
+        tk.Button(buttons, text="Anchor to image", command=lambda: self.anchor_selected(True)).pack(side='left')
+        tk.Button(buttons, text="Fixed position", command=lambda: self.anchor_selected(False)).pack(side='left',
+                                                                                                 padx=5)
+        tk.Button(buttons, text="Wait for change",
+                  command=lambda: self.wait_selected(WAIT_CHANGE)).pack(side='left')
+        tk.Button(buttons, text="Wait for color", command=lambda: self.wait_selected(WAIT_COLOR)).pack(side='left')
+        tk.Button(buttons, text="No wait", command=lambda: self.wait_selected(None)).pack(side='left', padx=5)
+        self.count_label = tk.Label(buttons, text="", fg='gray')
+        self.count_label.pack(side='left', padx=5)
+        self.frame.pack(fill='x')
+        buttons.pack(fill='x', pady=(2, 0))
+    
+    def refresh(self):
+        """Re-fill the visible rows from the script's targets."""
+        self._close_editor()
+        total = self.script.target_count
+        self.offset = max(0, min(self.offset, total - self.VISIBLE_ROWS))
+        shown = min(self.VISIBLE_ROWS, total - self.offset)
+        
+        rows = self.script.step_rows(self.offset, self.offset + shown)
+        anchors, waits = self.script.anchors, self.script.waits
+        for slot, (number, x, y, delay_ms) in zip(self._slots, rows):
+            notes = [waits[number - 1].describe()] if number - 1 in waits else []
+            if number - 1 in anchors:
+                notes.insert(0, "image")
+            position = f"{x}, {y} ({', '.join(notes)})" if notes else f"{x}, {y}"
+            self.tree.item(slot, values=(number, delay_ms, position))
+        # Detach unused slots instead of deleting them so they can be reused
+        if shown != self._shown:
+            for index, slot in enumerate(self._slots):
+                if index < shown:
+                    self.tree.move(slot, '', index)
+                else:
+                    self.tree.detach(slot)
+            self.tree.configure(height=max(1, shown))
+            self._shown = shown
+        
+        if total:
+            self.scrollbar.set(self.offset / total, (self.offset + shown) / total)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        self.count_label.config(text=f"{total} target(s)")
+    
+    def scroll_to_end(self):
+        """Scroll so the last target is visible."""
+        self._scroll_to(self.script.target_count)
+    
+    def _scroll_to(self, offset: int):
+        """Scroll so the target at offset is the first visible row."""
+        self.tree.selection_remove(self.tree.selection())
+        self.offset = offset
+        self.refresh()
+        return 'break'
+    
+    def _on_scrollbar(self, action, amount, unit=None):
+        """Handle scrollbar drags and arrow clicks."""
+        if action == 'moveto':
+            self._scroll_to(int(float(amount) * self.script.target_count))
+        elif action == 'scroll':
+            step = self.VISIBLE_ROWS if unit == 'pages' else 1
+            self._scroll_to(self.offset + int(amount) * step)
+    
+    def _on_mousewheel(self, event):
+        """Scroll the table instead of the scripts list."""
+        return self._scroll_to(self.offset - int(event.delta / 120) * 3)
+    
+    def _target_at_slot(self, slot: str) -> Optional[Target]:
+        """Return the target shown in a row slot."""
+        index = self.offset + self._slots.index(slot)
+        if index < self.script.target_count:
+            return self.script.targets[index]
+        return None
+    
+    def _on_double_click(self, event):
+        """Edit the delay of the clicked row in place."""
+        slot = self.tree.identify_row(event.y)
+        if not slot or self.tree.identify_column(event.x) != '#2':
+            return
+        target = self._target_at_slot(slot)
+        bbox = self.tree.bbox(slot, 'delay')
+        if target is None or not bbox:
+            return
+        
+        self._close_editor()
+        x, y, width, height = bbox
+        self._editor = entry = tk.Entry(self.tree, justify='right')
+        entry.insert(0, str(target.delay_ms))
+        entry.select_range(0, 'end')
+        entry.place(x=x, y=y, width=width, height=height)
+        entry.focus_set()
+        entry.bind('<Return>', lambda e, t=target: self._commit_editor(t))
+        entry.bind('<FocusOut>', lambda e, t=target: self._commit_editor(t))
+        entry.bind('<Escape>', lambda e: self._close_editor())
+    
+    def _commit_editor(self, target: Target):
+        """Store the edited delay if it is a valid number."""
+        if self._editor is None:
+            return
+        try:
+            self.app._set_target_delay(self.script, target, int(self._editor.get()))
+        except ValueError:
+            pass
+        self.refresh()
+    
+    def _close_editor(self):
+        """Remove the in-place editor without saving."""
+        if self._editor is not None:
+            editor, self._editor = self._editor, None
+            editor.destroy()
+    
+    def _selected_indexes(self) -> List[int]:
+        """Step indexes of the selected rows."""
+        indexes = [self.offset + self._slots.index(slot) for slot in self.tree.selection()]
+        return [index for index in indexes if index < self.script.target_count]
+    
+    def anchor_selected(self, anchored: bool):
+        """Anchor the selected targets to what is on screen under them, or unanchor them."""
+        indexes = self._selected_indexes()
+        if indexes:
+            self.app._anchor_targets(self.script, indexes, anchored)
+            self.refresh()
+    
+    def wait_selected(self, mode: Optional[str]):
+        """Make the selected targets wait for a screen condition (None removes it)."""
+        indexes = self._selected_indexes()
+        if indexes:
+            self.app._set_target_waits(self.script, indexes, mode)
+            self.refresh()
+    
+    def delete_selected(self):
+        """Delete the selected targets."""
+        targets = [self._target_at_slot(slot) for slot in self.tree.selection()]
+        self.tree.selection_remove(self.tree.selection())
+        for target in targets:
+            if target is not None:
+                self.app._delete_target(self.script, target)
+
+
 class Script:
     """Represents a script with targets and keybind."""
     
+    return_mouse = _PlanField()
+    return_delay_ms = _PlanField()
+    spin_ms = _PlanField()
+    repeat_mode = _PlanField()
+    repeat_count = _PlanField()
+    repeat_duration_ms = _PlanField()
+    target_cps = _PlanField()
+    optimize = _PlanField()
+    
     def __init__(self, parent, name: str = None):
+        self._plan: Optional[ExecutionPlan] = None
+        self._last_plan: Optional[ExecutionPlan] = None  # Last complete plan, possibly stale
+        self._plan_version = 0
+        self._edits_in_progress = 0  # Multi-field edits under way on the Tk thread
         self.parent = parent
         self.name = name or f"Script {len(parent.scripts) + 1}"
-        self.targets: List[Target] = []
+        self._targets: List[Target] = []
+        self._packed: Optional[PackedScript] = None  # Targets still encoded in a script pack
         self.keybind: List[str] = []
         self.is_editing = False
         self.frame = None
         self.target_frame = None
+        self.target_table: Optional[TargetTable] = None
         self.return_mouse = False
         self.return_delay_ms = 500
+        self.spin_ms = DEFAULT_SPIN_MS
+        self.repeat_mode = REPEAT_ONCE
+        self.repeat_count = 1
+        self.repeat_duration_ms = 10000
+        self.target_cps = 0.0  # Clicks per second; 0 follows the step delays
+        self.optimize = False  # Coalesce redundant steps when compiling; saved steps are untouched
+        self.last_report: Optional[RunReport] = None
+        self.live_report: Optional[RunReport] = None  # Report of the run in progress or the last one
+        self.backend: Optional[InjectionBackend] = None  # Overrides backend_name when set
+        self.backend_name: Optional[str] = None  # Name in backends.BACKENDS; None uses the default
+        self.overlap_policy = OVERLAP_DROP  # What to do when triggered while running
+        self.queue_limit = 1  # Max runs waiting with the queue policy
+        self.priority = 0  # Steps of higher-priority scripts fire first when due together
+        self.anchors: Dict[int, 'ImageAnchor'] = {}  # Image-anchored targets by step index
+        self.waits: Dict[int, 'ScreenWait'] = {}  # Screen conditions steps wait for, by step index
+    
+    @property
+    def targets(self) -> List[Target]:
+        """The script's targets, decoded from its script pack on first access."""
+        if self._packed is not None:
+            packed, self._packed = self._packed, None
+            self._targets = [Target(self.parent, self, number, x, y, delay_ms)
+                             for number, (x, y, delay_ms) in enumerate(packed.steps(), 1)]
+            if self.is_editing:
+                for target in self._targets:
+                    target.make_editable()
+        return self._targets
+    
+    @targets.setter
+    def targets(self, targets: List[Target]):
+        self._packed = None
+        self._targets = targets
+        self.invalidate_plan()
+    
+    @property
+    def target_count(self) -> int:
+        """Number of targets, without decoding a packed script."""
+        if self._packed is not None:
+            return len(self._packed)
+        return len(self._targets)
+    
+    def step_rows(self, start: int, stop: int) -> List[Tuple[int, int, int, int]]:
+        """Return (number, x, y, delay_ms) for targets start..stop-1 without decoding the rest."""
+        if self._packed is not None:
+            xs, ys, delays_ms = self._packed.read_range(start, stop)
+            return [(start + i + 1, x, y, delay_ms) for i, (x, y, delay_ms) in enumerate(zip(xs, ys, delays_ms))]
+        return [(target.number, target.x, target.y, target.delay_ms) for target in self._targets[start:stop]]
+    
+    def to_columns(self) -> Tuple[array, array, array]:
+        """Return the x, y and delay_ms columns of the targets."""
+        if self._packed is not None:
+            return self._packed.columns()
+        targets = list(self._targets)
+        return (array('i', [target.x for target in targets]),
+                array('i', [target.y for target in targets]),
+                array('i', [target.delay_ms for target in targets]))
     
     def add_target(self, x: int = None, y: int = None, delay_ms: int = 500) -> Target:
         """Add a new target to the script."""
         if x is None or y is None:
             # Default position in center of screen
-            x, y = pyautogui.size()
+            x, y = get_default_backend().screen_size()
             x //= 2
             y //= 2
         
         number = len(self.targets) + 1
         target = Target(self.parent, self, number, x, y, delay_ms)
         self.targets.append(target)
+        self.invalidate_plan()
         
         # Make editable if script is in edit mode
         if self.is_editing:
@@ -185,19 +661,115 @@ class Script:
         self.parent._update_script_ui(self)
         return target
     
+    def add_targets(self, steps: Iterable[Tuple[int, int, int]]) -> List[Target]:
+        """Add many (x, y, delay_ms) targets at once with a single UI refresh."""
+        targets = self.targets
+        new_targets = [Target(self.parent, self, number, x, y, delay_ms)
+                       for number, (x, y, delay_ms) in enumerate(steps, len(targets) + 1)]
+        if self.is_editing:
+            for target in new_targets:
+                target.make_editable()
+        
+        targets.extend(new_targets)
+        self.invalidate_plan()
+        self.parent._update_script_ui(self)
+        return new_targets
+    
     def remove_target(self, target: Target):
         """Remove a target from the script."""
         if target in self.targets:
+            index = self.targets.index(target)
             self.targets.remove(target)
+            self.anchors = self._without_step(self.anchors, index)
+            self.waits = self._without_step(self.waits, index)
+            self.invalidate_plan()
             target.destroy()
             self._renumber_targets()
             self.parent._update_script_ui(self)
     
+    @staticmethod
+    def _without_step(steps: Dict[int, Any], index: int) -> Dict[int, Any]:
+        """Re-key a by-step-index mapping after the step at index was removed."""
+        return {step - (step > index): value for step, value in steps.items() if step != index}
+    
+    def set_anchor(self, index: int, anchor: Optional['ImageAnchor']):
+        """Anchor the target at index to an image, or make it a fixed position again with None."""
+        if anchor is None:
+            self.anchors.pop(index, None)
+        else:
+            self.anchors[index] = anchor
+        self.invalidate_plan()
+    
+    def set_wait(self, index: int, wait: Optional['ScreenWait']):
+        """Make the step at index wait for a screen condition, or only for its delay with None."""
+        if wait is None:
+            self.waits.pop(index, None)
+        else:
+            self.waits[index] = wait
+        self.invalidate_plan()
+    
+    def destroy_targets(self):
+        """Destroy the windows of all decoded targets."""
+        for target in self._targets:
+            target.destroy()
+    
+    def detach_pack(self):
+        """Copy still-encoded targets into memory so the script pack can be closed."""
+        if self._packed is not None:
+            self._packed.detach()
+    
     def _renumber_targets(self):
         """Renumber targets sequentially."""
         for i, target in enumerate(self.targets, 1):
             target.update_number(i)
     
+    def _plan_changed(self):
+        """Invalidate the compiled plan after a run setting changes."""
+        self.invalidate_plan()
+    
+    def invalidate_plan(self):
+        """Drop the compiled plan so the next run rebuilds it."""
+        self._plan_version += 1
+        self._plan = None
+    
+    @property
+    def last_plan(self) -> Optional[ExecutionPlan]:
+        """The most recently compiled plan, without compiling; it may predate later edits."""
+        return self._last_plan
+    
+    @property
+    def plan_is_current(self) -> bool:
+        """Whether last_plan includes every edit."""
+        return self._plan is not None
+    
+    def compile(self) -> ExecutionPlan:
+        """Return the immutable execution plan, rebuilding it only after edits.
+        
+        Runs on the hotkey and scheduler threads while the Tk thread may be
+        dragging targets, so a plan only counts if no edit started or ended
+        while it was built. Otherwise the last complete plan is used, or the
+        build is retried if there has never been one.
+        """
+        plan = self._plan
+        while plan is None:
+            version = self._plan_version
+            if not self._edits_in_progress:
+                built = self._build_plan()
+                if version == self._plan_version and not self._edits_in_progress:
+                    self._plan = self._last_plan = built
+                    if version != self._plan_version:
+                        self._plan = None  # Invalidated just before it was cached
+                    return built
+            plan = self._last_plan
+            if plan is None:
+                time.sleep(0.001)
+        return plan
+    
+    def _build_plan(self) -> ExecutionPlan:
+        xs, ys, delays_ms = self.to_columns()
+        settings = {key: getattr(self, key) for key in PLAN_SETTINGS}
+        return ExecutionPlan(xs, ys, delays_ms, anchors=self.anchors, waits=self.waits, **settings)
+    
     def set_editing(self, editing: bool):
         """Set edit mode for the script."""
         self.is_editing = editing
@@ -212,95 +784,426 @@ class Script:
         new_script = Script(self.parent, f"{self.name} (Copy)")
         new_script.return_mouse = self.return_mouse
         new_script.return_delay_ms = self.return_delay_ms
-        for target in self.targets:
-            x, y = target.get_position()
-            new_script.add_target(x, y, target.delay_ms)
+        new_script.spin_ms = self.spin_ms
+        new_script.repeat_mode = self.repeat_mode
+        new_script.repeat_count = self.repeat_count
+        new_script.repeat_duration_ms = self.repeat_duration_ms
+        new_script.target_cps = self.target_cps
+        new_script.optimize = self.optimize
+        new_script.backend = self.backend
+        new_script.backend_name = self.backend_name
+        new_script.overlap_policy = self.overlap_policy
+        new_script.queue_limit = self.queue_limit
+        new_script.priority = self.priority
+        new_script.anchors = {index: anchor.copy() for index, anchor in self.anchors.items()}
+        new_script.waits = {index: wait.copy() for index, wait in self.waits.items()}
+        new_script.add_targets(zip(*self.to_columns()))
         return new_script
     
-    def execute(self):
-        """Execute the script by clicking all targets in order."""
-        if not self.targets:
-            return
-        
-        # Save starting mouse position if return is enabled
-        start_x, start_y = None, None
-        if self.return_mouse:
-            start_x, start_y = pyautogui.position()
-        
-        # Click all targets
-        for target in self.targets:
-            x, y = target.get_position()
-            time.sleep(target.delay_ms / 1000.0)  # Convert ms to seconds
-            pyautogui.click(x, y)
-        
-        # Return mouse to starting position if enabled
-        if self.return_mouse and start_x is not None and start_y is not None:
-            time.sleep(self.return_delay_ms / 1000.0)  # Wait before returning
-            pyautogui.moveTo(start_x, start_y)
+    def start_run(self, backend: Optional[InjectionBackend] = None,
+                  cancel: Optional[CancelToken] = None) -> Optional[PlanRun]:
+        """Begin a run of the compiled plan, to be driven step by step.
+        
+        Returns None if the script has no targets. The run reads only the
+        compiled plan, so dragging targets mid-run cannot affect it.
+        """
+        plan = self.compile()
+        if not plan:
+            return None
+        run = PlanRun(plan, backend or self.backend or get_backend(self.backend_name), cancel)
+        self.live_report = run.report
+        return run
     
-    def to_dict(self) -> Dict[str, Any]:
-        """Convert script to dictionary for JSON serialization."""
+    def finish_run(self, run: PlanRun):
+        """Keep the report of a run that has ended and add it to the run metrics."""
+        self.last_report = run.report
+        metrics = getattr(self.parent, 'metrics', None)
+        if metrics is not None:
+            metrics.add(self.name, run.report)
+    
+    def execute(self, backend: Optional[InjectionBackend] = None,
+                cancel: Optional[CancelToken] = None) -> Optional[RunReport]:
+        """Execute the script on the calling thread by clicking all targets in order.
+        
+        Each click is scheduled against an absolute deadline measured from the
+        start of the run, so lateness of one step does not shift the others.
+        Waits wake up as soon as cancel is set, so the run stops within a
+        few milliseconds of being cancelled.
+        """
+        run = self.start_run(backend, cancel)
+        if run is None:
+            return None
+        report = run_blocking(run, run.plan.spin_ms)
+        self.finish_run(run)
+        return report
+    
+    def settings_dict(self) -> Dict[str, Any]:
+        """Convert everything except the targets to a dictionary."""
         return {
             'name': self.name,
             'keybind': self.keybind,
-            'targets': [target.to_dict() for target in self.targets],
             'return_mouse': self.return_mouse,
-            'return_delay_ms': self.return_delay_ms
+            'return_delay_ms': self.return_delay_ms,
+            'spin_ms': self.spin_ms,
+            'repeat_mode': self.repeat_mode,
+            'repeat_count': self.repeat_count,
+            'repeat_duration_ms': self.repeat_duration_ms,
+            'target_cps': self.target_cps,
+            'optimize': self.optimize,
+            'overlap_policy': self.overlap_policy,
+            'queue_limit': self.queue_limit,
+            'priority': self.priority,
+            'backend_name': self.backend_name,
+            'anchors': [dict(anchor.to_dict(), step=index) for index, anchor in sorted(self.anchors.items())],
+            'waits': [dict(wait.to_dict(), step=index) for index, wait in sorted(self.waits.items())]
         }
     
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert script to dictionary for JSON serialization."""
+        return self.dict_from_columns(self.settings_dict(), self.to_columns())
+    
+    @staticmethod
+    def dict_from_columns(settings: Dict[str, Any], columns: Tuple[array, array, array]) -> Dict[str, Any]:
+        """Build the JSON form of a script from its settings and target columns."""
+        data = dict(settings)
+        data['targets'] = [{'x': x, 'y': y, 'delay_ms': delay_ms} for x, y, delay_ms in zip(*columns)]
+        return data
+    
+    def _apply_settings(self, data: Dict[str, Any]):
+        """Apply settings from a dictionary made by settings_dict."""
+        self.keybind = data.get('keybind', [])
+        self.return_mouse = data.get('return_mouse', False)
+        self.return_delay_ms = data.get('return_delay_ms', 500)
+        self.spin_ms = data.get('spin_ms', DEFAULT_SPIN_MS)
+        self.repeat_mode = data.get('repeat_mode', REPEAT_ONCE)
+        self.repeat_count = data.get('repeat_count', 1)
+        self.repeat_duration_ms = data.get('repeat_duration_ms', 10000)
+        self.target_cps = data.get('target_cps', 0.0)
+        self.optimize = data.get('optimize', False)
+        self.overlap_policy = data.get('overlap_policy', OVERLAP_DROP)
+        self.queue_limit = data.get('queue_limit', 1)
+        self.priority = data.get('priority', 0)
+        self.backend_name = data.get('backend_name')
+        self.anchors = {}
+        if data.get('anchors'):
+            from vision import ImageAnchor
+            self.anchors = {anchor_data['step']: ImageAnchor.from_dict(anchor_data)
+                            for anchor_data in data['anchors']}
+        self.waits = {}
+        if data.get('waits'):
+            from vision import ScreenWait
+            self.waits = {wait_data['step']: ScreenWait.from_dict(wait_data) for wait_data in data['waits']}
+    
+    @classmethod
+    def from_packed(cls, parent, packed: PackedScript) -> 'Script':
+        """Create script from a script pack entry; targets are materialized on first use."""
+        script = cls(parent, packed.metadata.get('name', 'Script'))
+        script._apply_settings(packed.metadata)
+        script._packed = packed
+        return script
+    
     @classmethod
     def from_dict(cls, parent, data: Dict[str, Any]) -> 'Script':
         """Create script from dictionary."""
         script = cls(parent, data.get('name', 'Script'))
-        script.keybind = data.get('keybind', [])
-        script.return_mouse = data.get('return_mouse', False)
-        script.return_delay_ms = data.get('return_delay_ms', 500)
-        for target_data in data.get('targets', []):
-            script.add_target(
-                target_data.get('x', 100),
-                target_data.get('y', 100),
-                target_data.get('delay_ms', 500)
-            )
+        script._apply_settings(data)
+        script.add_targets([
+            (target_data.get('x', 100), target_data.get('y', 100), target_data.get('delay_ms', 500))
+            for target_data in data.get('targets', [])
+        ])
         return script
 
 
+class MetricsPanel:
+    """Lateness percentiles of recent runs per script, with export."""
+    
+    REFRESH_MS = 1000
+    
+    def __init__(self, master, app: 'AutoclickerApp'):
+        self.app = app
+        self.store = app.metrics
+        self.visible = False
+        self._version = -1  # Store version last drawn
+        
+        self.frame = tk.LabelFrame(master, text="Run metrics")
+        self.tree = ttk.Treeview(self.frame, columns=('runs', 'p50', 'p99', 'injection', 'drift', 'cancelled'),
+                                 show='tree headings', height=5)
+        self.tree.heading('#0', text='Script')
+        self.tree.heading('runs', text='Runs')
+        self.tree.heading('p50', text='p50 late (ms)')
+        self.tree.heading('p99', text='p99 late (ms)')
+        self.tree.heading('injection', text='Max inject (ms)')
+        self.tree.heading('drift', text='Last drift (ms)')
+        self.tree.heading('cancelled', text='Cancelled')
+        self.tree.column('#0', width=160)
+        for column in ('runs', 'p50', 'p99', 'injection', 'drift', 'cancelled'):
+            self.tree.column(column, width=90, anchor='e', stretch=False)
+        self.tree.pack(fill='x', padx=5, pady=(5, 0))
+        
+        buttons = tk.Frame(self.frame)
+        buttons.pack(fill='x', padx=5, pady=5)
+        tk.Button(buttons, text="Export JSON", command=lambda: self._export('json')).pack(side='left', padx=(0, 5))
+        tk.Button(buttons, text="Export CSV", command=lambda: self._export('csv')).pack(side='left', padx=5)
+        tk.Button(buttons, text="Clear", command=self.store.clear).pack(side='left', padx=5)
+    
+    def show(self, before):
+        """Pack the panel above the given widget and start refreshing it."""
+        self.visible = True
+        self.frame.pack(fill='x', padx=10, before=before)
+        self._poll()
+    
+    def hide(self):
+        """Unpack the panel and stop refreshing it."""
+        self.visible = False
+        self.frame.pack_forget()
+    
+    def _poll(self):
+        if not self.visible:
+            return
+        if self.store.version != self._version:
+            self.refresh()
+        self.frame.after(self.REFRESH_MS, self._poll)
+    
+    def refresh(self):
+        """Redraw the per-script summary."""
+        self._version = self.store.version
+        self.tree.delete(*self.tree.get_children())
+        for script, stats in sorted(self.store.summary().items()):
+            self.tree.insert('', 'end', text=script, values=(
+                stats['runs'],
+                f"{stats['p50_lateness_ms']:.2f}",
+                f"{stats['p99_lateness_ms']:.2f}",
+                f"{stats['max_injection_ms']:.2f}",
+                f"{stats['last_drift_ms']:.2f}",
+                stats['cancelled']
+            ))
+    
+    def _export(self, kind: str):
+        """Export the stored runs as JSON or CSV."""
+        filename = filedialog.asksaveasfilename(
+            defaultextension=f".{kind}",
+            filetypes=[(f"{kind.upper()} files", f"*.{kind}"), ("All files", "*.*")]
+        )
+        if filename:
+            try:
+                if kind == 'json':
+                    self.store.export_json(filename)
+                else:
+                    self.store.export_csv(filename)
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to export metrics: {e}")
+
+
+class BackgroundTask:
+    """Blocking work run on a worker thread, reporting back on the Tk thread.
+    
+    The worker must only touch what it was given, never Tk widgets or live
+    scripts. Progress and the outcome are queued and picked up by an after()
+    poll, so every callback runs on the Tk thread.
+    """
+    
+    POLL_MS = 50
+    
+    def __init__(self, root: tk.Tk, work, on_done, on_error, on_progress=None):
+        self.root = root
+        self.cancel_token = CancelToken()
+        self._work = work
+        self._on_done = on_done
+        self._on_error = on_error
+        self._on_progress = on_progress
+        self._messages = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='background-task', daemon=True)
+    
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_token.is_set()
+    
+    def start(self):
+        """Start the worker and the poll that hands its results back."""
+        self._thread.start()
+        self.root.after(self.POLL_MS, self._poll)
+    
+    def cancel(self):
+        """Ask the worker to stop at its next check."""
+        self.cancel_token.cancel()
+    
+    def progress(self, done: int, total: int):
+        """Report progress from the worker thread."""
+        self._messages.put(('progress', done, total))
+    
+    def _run(self):
+        try:
+            result = self._work(self)
+        except Exception as e:
+            self._messages.put(('error', e))
+        else:
+            self._messages.put(('done', result))
+    
+    def _poll(self):
+        progress = None
+        while True:
+            try:
+                message = self._messages.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == 'progress':
+                progress = message[1:]
+            elif message[0] == 'done':
+                self._on_done(message[1])
+                return
+            else:
+                self._on_error(message[1])
+                return
+        # Only the latest progress is worth drawing
+        if progress is not None and self._on_progress is not None:
+            self._on_progress(*progress)
+        self.root.after(self.POLL_MS, self._poll)
+
+
+class StartupProfile:
+    """Timestamps of the cold-start phases, for --startup-profile."""
+    
+    def __init__(self, started: float = _IMPORT_STARTED, budget_ms: Optional[float] = None):
+        self.started = started
+        self.budget_ms = budget_ms  # Time allowed until the window is shown
+        self.marks: List[Tuple[str, float]] = []
+    
+    def mark(self, phase: str):
+        """Record that a phase has just finished."""
+        self.marks.append((phase, time.perf_counter()))
+    
+    def elapsed_ms(self, phase: str) -> Optional[float]:
+        """Time from the start until phase finished."""
+        for name, at in self.marks:
+            if name == phase:
+                return (at - self.started) * 1000.0
+        return None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Phase durations and cumulative times in milliseconds."""
+        phases = []
+        previous = self.started
+        for name, at in self.marks:
+            phases.append({'phase': name, 'ms': (at - previous) * 1000.0, 'at_ms': (at - self.started) * 1000.0})
+            previous = at
+        shown_ms = self.elapsed_ms('window shown')
+        return {
+            'phases': phases,
+            'window_shown_ms': shown_ms,
+            'budget_ms': self.budget_ms,
+            'over_budget': self.budget_ms is not None and shown_ms is not None and shown_ms > self.budget_ms
+        }
+
+
 class AutoclickerApp:
     """Main application class."""
     
-    def __init__(self):
+    def __init__(self, render_mode: Optional[str] = None, autosave_dir: Optional[str] = AUTOSAVE_DIR,
+                 startup: Optional[StartupProfile] = None, on_started=None):
+        self.startup = startup or StartupProfile()
+        self.startup.mark('imports')
+        self._on_started = on_started  # Called with the profile once the tray is up
+        install_callback_timing()  # Must precede Tk() so every callback can be timed
         self.root = tk.Tk()
         self.root.title("Autoclicker")
         self.root.geometry("800x700")
         
         self.scripts: List[Script] = []
+        self.script_frames: Dict[Script, tk.Frame] = {}  # Script frames, in display order
         self.current_editing_script: Optional[Script] = None
         self.is_running = False
-        self.keybind_hooks = []
+        self._rate_refresh: Optional[str] = None  # after() id of the rate display loop while running
+        self.hotkeys = HotkeyDispatcher()  # Hooked only in run mode; bindings kept up to date
+        self.hotkeys.bind(PANIC_HOTKEY, PANIC_HOTKEY.split('+'), self._panic_stop)
+        self.executors = ExecutorPool()
+        self.script_pack: Optional[ScriptPack] = None  # Open pack backing not-yet-decoded scripts
+        self.task: Optional[BackgroundTask] = None  # Save or load running in the background
+        
+        # Target rendering while editing; by default the overlay only where it is click-through
+        if render_mode is None:
+            render_mode = RENDER_OVERLAY if TargetOverlay.supported(self.root) else RENDER_WINDOWS
+        self.render_mode = render_mode
+        self.overlay = None
+        if render_mode == RENDER_OVERLAY:
+            self.overlay = TargetOverlay(self.root, on_finish=self._finish_editing,
+                                         on_move=self._on_target_moved)
+        
+        # Autosave: every edit is appended to a journal replayed on startup
+        self.journal = ChangeJournal(autosave_dir) if autosave_dir else None
+        
+        # Timing of recent runs; subscribe() to feed external monitoring
+        self.metrics = MetricsStore()
+        
+        # Live click recording into one script at a time
+        self.recorder: Optional[ClickRecorder] = None
+        self.recording_script: Optional[Script] = None
+        self._record_carry_ms = 0  # Delay of skipped clicks, added to the next recorded one
         
         # System tray
         self.tray_icon = None
         self.tray_thread = None
         
+        self.startup.mark('tk root')
         self._create_ui()
-        self._setup_system_tray()
+        self.startup.mark('ui')
+        
+        # Event-loop stall detection, toggled from the UI or the environment
+        self.stall_monitor = StallMonitor.from_environment(self.root)
+        self.stall_monitor.on_stall = self._report_stall
+        self.stall_var.set(self.stall_monitor.enabled)
+        
+        self._restore_autosave()
+        self.startup.mark('autosave restored')
+        # The tray waits until the window is on screen
+        self.root.bind('<Map>', self._on_first_map, add='+')
         self._setup_window_close()
     
+    def _on_first_map(self, event):
+        """Start the deferred parts of startup once the main window is first shown."""
+        if event.widget is not self.root:
+            return
+        self.root.unbind('<Map>')
+        self.startup.mark('window shown')
+        self.root.after_idle(self._finish_startup)
+    
+    def _finish_startup(self):
+        self._setup_system_tray()
+        self.startup.mark('tray started')
+        if self._on_started is not None:
+            self._on_started(self.startup)
+    
     def _create_ui(self):
         """Create the main UI."""
         # Top buttons
         top_frame = tk.Frame(self.root)
         top_frame.pack(pady=10, padx=10, fill='x')
         
-        tk.Button(top_frame, text="Save Scripts", command=self._save_scripts).pack(side='left', padx=5)
-        tk.Button(top_frame, text="Load Scripts", command=self._load_scripts).pack(side='left', padx=5)
+        self.save_button = tk.Button(top_frame, text="Save Scripts", command=self._save_scripts)
+        self.save_button.pack(side='left', padx=5)
+        self.load_button = tk.Button(top_frame, text="Load Scripts", command=self._load_scripts)
+        self.load_button.pack(side='left', padx=5)
         self.run_button = tk.Button(top_frame, text="Run", command=self._toggle_run, 
                                    bg='lightgreen', font=('Arial', 10, 'bold'))
         self.run_button.pack(side='left', padx=5)
+        tk.Button(top_frame, text="Metrics", command=self._toggle_metrics).pack(side='left', padx=5)
+        self.stall_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(top_frame, text="Stall monitor", variable=self.stall_var,
+                       command=self._toggle_stall_monitor).pack(side='left', padx=5)
+        self.status_label = tk.Label(top_frame, text=f"Panic stop: {self._format_keybind(PANIC_HOTKEY.split('+'))}",
+                                     fg='gray')
+        self.status_label.pack(side='left', padx=15)
+        
+        # Progress of long operations (only packed while one is running)
+        self.progress_bar = ttk.Progressbar(top_frame, length=150, mode='determinate')
+        self.cancel_task_button = tk.Button(top_frame, text="Cancel", command=self._cancel_task)
         
         # Scripts container
         self.scripts_frame = tk.Frame(self.root)
         self.scripts_frame.pack(fill='both', expand=True, padx=10, pady=10)
         
+        # Run metrics (only packed while shown)
+        self.metrics_panel = MetricsPanel(self.root, self)
+        
         # Add script button
         add_script_frame = tk.Frame(self.root)
         add_script_frame.pack(pady=10)
@@ -342,25 +1245,199 @@ class AutoclickerApp:
         # Store canvas window ID for later updates
         self.canvas_window_id = self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
     
+    def _restore_autosave(self):
+        """Rebuild the library from the autosave snapshot and journal.
+        
+        If they cannot be read or replayed, they are moved aside untouched and
+        autosave is switched off, rather than overwritten with a partial library.
+        """
+        if self.journal is None:
+            return
+        try:
+            self._replay_autosave()
+        except Exception as e:
+            for script in self.scripts:
+                script.destroy_targets()
+            self.scripts = []
+            if self.script_pack is not None:
+                self.script_pack.close()
+                self.script_pack = None
+            self._quarantine_autosave(e)
+        self._rebind_hotkeys()
+        self._update_scripts_ui()
+    
+    def _replay_autosave(self):
+        """Load the snapshot and replay the journal, then keep appending to the journal."""
+        snapshot, entries = self.journal.load()
+        scripts_data = snapshot.get('scripts', []) if snapshot else []
+        # Like a loaded library, targets are only decoded when a script is used
+        self.scripts = []
+        for data in scripts_data:
+            settings = {key: value for key, value in data.items() if key != 'targets'}
+            self.scripts.append(Script.from_packed(self, PackedScript.from_columns(settings, columns_from_dict(data))))
+        for entry in entries:
+            self._apply_journal_entry(entry)
+        self.journal.resume(entries)
+        # A loaded library is only referenced by path until it is folded in
+        if (self.journal.pending >= self.journal.compact_every
+                or any(entry['op'] == 'load' for entry in entries)):
+            self.root.after_idle(self._compact_journal)
+    
+    def _quarantine_autosave(self, error: Exception):
+        """Keep an unreadable autosave aside and stop autosaving."""
+        print(f"Error restoring autosave: {error}")
+        try:
+            moved = self.journal.quarantine()
+        except OSError as e:
+            moved = []
+            print(f"Error moving autosave aside: {e}")
+        self.journal = None
+        kept = "\n".join(moved) or "(nothing to keep)"
+        self.root.after_idle(lambda: messagebox.showwarning(
+            "Autosave disabled",
+            f"The autosaved library could not be restored: {error}\n\n"
+            f"The files were kept as:\n{kept}\n\nAutosave is off until the next start."))
+    
+    def _apply_journal_entry(self, entry: Dict[str, Any]):
+        """Replay one journaled edit onto the model."""
+        op = entry['op']
+        if op == 'add_script':
+            self.scripts.append(Script.from_dict(self, entry['data']))
+            return
+        if op == 'load':
+            pack, entries = read_library(entry['path'])
+            for script in self.scripts:
+                script.destroy_targets()
+            if self.script_pack is not None:
+                self.script_pack.close()
+            self.script_pack = pack
+            self.scripts = [Script.from_packed(self, packed) for packed in entries]
+            return
+        
+        script = self.scripts[entry['s']]
+        if op == 'duplicate':
+            self.scripts.append(script.duplicate())
+        elif op == 'delete_script':
+            script.destroy_targets()
+            self.scripts.remove(script)
+        elif op == 'rename':
+            script.name = entry['name']
+        elif op == 'keybind':
+            script.keybind = entry['keys']
+        elif op == 'set' and entry['field'] in JOURNALED_SETTINGS:
+            setattr(script, entry['field'], entry['value'])
+        elif op == 'add_targets':
+            script.add_targets(entry['steps'])
+        elif op == 'remove_target':
+            script.remove_target(script.targets[entry['t']])
+        elif op == 'move_target':
+            script.targets[entry['t']].move_to(entry['x'], entry['y'])
+        elif op == 'delay':
+            script.targets[entry['t']].delay_ms = entry['d']
+        elif op == 'anchor':
+            from vision import ImageAnchor
+            script.set_anchor(entry['t'], ImageAnchor.from_dict(entry['data']) if entry['data'] else None)
+        elif op == 'wait':
+            from vision import ScreenWait
+            script.set_wait(entry['t'], ScreenWait.from_dict(entry['data']) if entry['data'] else None)
+    
+    def _library_snapshot(self) -> Dict[str, Any]:
+        """Return the whole library in save-file form."""
+        return {'scripts': [script.to_dict() for script in self.scripts]}
+    
+    def _journal(self, op: str, script: Optional[Script] = None, **fields):
+        """Append an edit to the autosave journal, compacting it when due.
+        
+        Called after the edit has been applied, so a compaction always
+        includes it.
+        """
+        if self.journal is None:
+            return
+        if script is not None:
+            fields['s'] = self.scripts.index(script)
+        try:
+            if self.journal.record(op, **fields):
+                self.root.after_idle(self._compact_journal)
+        except OSError as e:
+            print(f"Error writing autosave journal: {e}")
+    
+    def _compact_journal(self):
+        """Fold the journal into a new autosave snapshot.
+        
+        As with saving, the library is snapshotted here on the Tk thread and
+        encoded and written in the background; edits made meanwhile keep
+        going to the journal and are carried into the new one.
+        """
+        journal = self.journal
+        if journal is None or journal.compacting:
+            return
+        snapshot = [(script.settings_dict(), script.to_columns()) for script in self.scripts]
+        header = journal.begin_compaction()
+        
+        def work(task: BackgroundTask):
+            scripts_data = [Script.dict_from_columns(settings, columns) for settings, columns in snapshot]
+            journal.write_snapshot(dict(header, scripts=scripts_data))
+        
+        def on_done(result):
+            try:
+                journal.end_compaction()
+            except OSError as e:
+                print(f"Error starting autosave journal: {e}")
+        
+        def on_error(e: Exception):
+            journal.abort_compaction()
+            print(f"Error writing autosave snapshot: {e}")
+        
+        BackgroundTask(self.root, work, on_done, on_error).start()
+    
     def _add_script(self):
         """Add a new script."""
         script = Script(self, None)
         self.scripts.append(script)
+        self._journal('add_script', data=script.to_dict())
         self._update_scripts_ui()
     
     def _update_scripts_ui(self):
-        """Update the entire scripts UI."""
-        # Clear existing script frames
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
+        """Reconcile script frames with the script list, touching only what changed."""
+        current = set(self.scripts)
         
-        # Create UI for each script
+        # Destroy frames of scripts that are gone
+        for script in [s for s in self.script_frames if s not in current]:
+            self.script_frames.pop(script).destroy()
+            script.frame = None
+            script.target_frame = None
+            script.target_table = None
+        
+        # Create frames for new scripts; they are packed at the end
         for script in self.scripts:
-            self._create_script_ui(script)
+            if script not in self.script_frames:
+                self._create_script_ui(script)
+                self.script_frames[script] = script.frame
+        
+        # Repack only if the display order no longer matches
+        if list(self.script_frames) != self.scripts:
+            for frame in self.script_frames.values():
+                frame.pack_forget()
+            self.script_frames = {script: script.frame for script in self.scripts}
+            for frame in self.script_frames.values():
+                frame.pack(fill='x', pady=5, padx=5)
         
         # Update scroll region after UI is updated
         self.root.after_idle(self._update_scroll_region)
     
+    def _refresh_script_header(self, script: Script):
+        """Update the edit button, keybind button and highlight of one script."""
+        if not script.frame:
+            return
+        script.edit_btn.config(text="Finish editing" if script.is_editing else "Edit script")
+        script.record_btn.config(text="Stop recording" if script is self.recording_script else "Record clicks")
+        keybind_text = f"Keybind: {self._format_keybind(script.keybind)}" if script.keybind else "Set keybind"
+        script.keybind_btn.config(text=keybind_text)
+        if script.is_editing:
+            script.frame.config(bg='lightyellow', relief='solid', borderwidth=3)
+        else:
+            script.frame.config(bg=script.frame_bg, relief='raised', borderwidth=2)
+    
     def _update_scroll_region(self):
         """Update the scroll region of the canvas."""
         self.canvas.update_idletasks()
@@ -373,6 +1450,7 @@ class AutoclickerApp:
         # Main script frame
         script.frame = tk.Frame(self.scrollable_frame, relief='raised', borderwidth=2, padx=10, pady=10)
         script.frame.pack(fill='x', pady=5, padx=5)
+        script.frame_bg = script.frame.cget('bg')  # Restored when editing finishes
         
         # Script header
         header_frame = tk.Frame(script.frame)
@@ -398,19 +1476,24 @@ class AutoclickerApp:
         
         # Edit/Finish button
         edit_text = "Finish editing" if script.is_editing else "Edit script"
-        edit_btn = tk.Button(buttons_frame, text=edit_text, 
-                           command=lambda s=script: self._toggle_edit_script(s))
-        edit_btn.pack(side='left', padx=5)
+        script.edit_btn = tk.Button(buttons_frame, text=edit_text, 
+                                    command=lambda s=script: self._toggle_edit_script(s))
+        script.edit_btn.pack(side='left', padx=5)
         
         # Add target button
         tk.Button(buttons_frame, text="Add target", 
                  command=lambda s=script: self._add_target(s)).pack(side='left', padx=5)
         
+        # Record clicks button
+        script.record_btn = tk.Button(buttons_frame, text="Record clicks",
+                                      command=lambda s=script: self._toggle_recording(s))
+        script.record_btn.pack(side='left', padx=5)
+        
         # Set keybind button
         keybind_text = f"Keybind: {self._format_keybind(script.keybind)}" if script.keybind else "Set keybind"
-        keybind_btn = tk.Button(buttons_frame, text=keybind_text,
-                               command=lambda s=script: self._set_keybind(s))
-        keybind_btn.pack(side='left', padx=5)
+        script.keybind_btn = tk.Button(buttons_frame, text=keybind_text,
+                                       command=lambda s=script: self._set_keybind(s))
+        script.keybind_btn.pack(side='left', padx=5)
         
         # Duplicate button
         tk.Button(buttons_frame, text="Duplicate", 
@@ -431,120 +1514,112 @@ class AutoclickerApp:
                                         command=lambda s=script: self._toggle_return(s))
         return_checkbox.pack(side='left', padx=5)
         
+        # Overlap policy for hotkey presses while the script is running
+        tk.Label(return_check_frame, text="If running:").pack(side='left', padx=(15, 5))
+        script.overlap_var = tk.StringVar(value=script.overlap_policy)
+        tk.OptionMenu(return_check_frame, script.overlap_var, *OVERLAP_POLICIES,
+                      command=lambda value, s=script: self._update_overlap_policy(s)).pack(side='left')
+        
+        tk.Label(return_check_frame, text="Queue limit:").pack(side='left', padx=(10, 5))
+        script.queue_limit_var = tk.StringVar(value=str(script.queue_limit))
+        queue_limit_entry = tk.Entry(return_check_frame, textvariable=script.queue_limit_var, width=5)
+        queue_limit_entry.pack(side='left')
+        queue_limit_entry.bind('<FocusOut>', lambda e, s=script: self._update_queue_limit(s))
+        queue_limit_entry.bind('<Return>', lambda e, s=script: self._update_queue_limit(s))
+        
+        tk.Label(return_check_frame, text="Priority:").pack(side='left', padx=(10, 5))
+        script.priority_var = tk.StringVar(value=str(script.priority))
+        priority_entry = tk.Entry(return_check_frame, textvariable=script.priority_var, width=4)
+        priority_entry.pack(side='left')
+        priority_entry.bind('<FocusOut>', lambda e, s=script: self._update_priority(s))
+        priority_entry.bind('<Return>', lambda e, s=script: self._update_priority(s))
+        
+        tk.Label(return_check_frame, text="Backend:").pack(side='left', padx=(10, 5))
+        script.backend_var = tk.StringVar(value=script.backend_name or DEFAULT_BACKEND_CHOICE)
+        tk.OptionMenu(return_check_frame, script.backend_var, *BACKEND_CHOICES,
+                      command=lambda value, s=script: self._update_backend(s)).pack(side='left')
+        
+        # Repeat mode and click rate
+        repeat_frame = tk.Frame(script.frame)
+        repeat_frame.pack(fill='x', pady=5)
+        
+        tk.Label(repeat_frame, text="Repeat:").pack(side='left', padx=5)
+        script.repeat_var = tk.StringVar(value=script.repeat_mode)
+        tk.OptionMenu(repeat_frame, script.repeat_var, *REPEAT_MODES,
+                      command=lambda value, s=script: self._update_repeat_mode(s)).pack(side='left')
+        
+        for label, field, parse in (("Times:", 'repeat_count', int),
+                                    ("For (ms):", 'repeat_duration_ms', int),
+                                    ("Rate (CPS, 0 = delays):", 'target_cps', float)):
+            tk.Label(repeat_frame, text=label).pack(side='left', padx=(10, 5))
+            var = tk.StringVar(value=str(getattr(script, field)))
+            entry = tk.Entry(repeat_frame, textvariable=var, width=6)
+            entry.pack(side='left')
+            update = lambda e, s=script, f=field, v=var, p=parse: self._update_repeat_setting(s, f, v, p)
+            entry.bind('<FocusOut>', update)
+            entry.bind('<Return>', update)
+        
+        script.optimize_var = tk.BooleanVar(value=script.optimize)
+        tk.Checkbutton(repeat_frame, text="Optimize", variable=script.optimize_var,
+                       command=lambda s=script: self._toggle_optimize(s)).pack(side='left', padx=(10, 0))
+        script.optimize_label = tk.Label(repeat_frame, text="", fg='gray')
+        script.optimize_label.pack(side='left')
+        self._show_optimization(script)
+        
+        script.rate_label = tk.Label(repeat_frame, text="", fg='gray')
+        script.rate_label.pack(side='left', padx=10)
+        
         # Targets list
         targets_label = tk.Label(script.frame, text="Targets:", font=('Arial', 10))
         targets_label.pack(anchor='w', pady=(10, 5))
         
         script.target_frame = tk.Frame(script.frame)
         script.target_frame.pack(fill='x', padx=20)
+        script.target_table = TargetTable(script.target_frame, self, script)
         
-        self._update_script_ui(script)
-    
-    def _save_delay_values(self, script: Script):
-        """Save delay values from Entry fields before UI update."""
-        if not script.target_frame:
-            return
+        # Return delay field (only packed when return is enabled)
+        script.return_delay_frame = tk.Frame(script.target_frame)
+        tk.Label(script.return_delay_frame, text="Return delay:", font=('Arial', 10)).pack(side='left', padx=5)
         
-        # Find all Entry widgets and save their values
-        for widget in script.target_frame.winfo_children():
-            if isinstance(widget, tk.Frame):
-                # Look for Entry widgets in this row
-                for child in widget.winfo_children():
-                    if isinstance(child, tk.Entry):
-                        try:
-                            # Get the value from the Entry
-                            entry_value = child.get()
-                            # Get target reference stored in Entry widget
-                            if hasattr(child, '_target_ref'):
-                                target = child._target_ref
-                                try:
-                                    delay = int(entry_value)
-                                    target.delay_ms = delay
-                                except ValueError:
-                                    pass
-                            # Check if this is the return delay entry
-                            elif hasattr(child, '_return_delay_ref'):
-                                try:
-                                    delay = int(entry_value)
-                                    script.return_delay_ms = delay
-                                except ValueError:
-                                    pass
-                        except:
-                            pass
+        return_delay_var = tk.StringVar(value=str(script.return_delay_ms))
+        return_delay_entry = tk.Entry(script.return_delay_frame, textvariable=return_delay_var, width=10)
+        return_delay_entry.pack(side='left', padx=5)
+        return_delay_entry.bind('<FocusOut>', lambda e, s=script, v=return_delay_var: self._update_return_delay(s, v))
+        return_delay_entry.bind('<Return>', lambda e, s=script, v=return_delay_var: self._update_return_delay(s, v))
+        # Commit valid values as they are typed so nothing is lost if focus never leaves
+        return_delay_var.trace_add('write', lambda *args, s=script, v=return_delay_var: self._sync_return_delay(s, v))
+        
+        tk.Label(script.return_delay_frame, text="ms", font=('Arial', 10)).pack(side='left', padx=5)
+        
+        self._refresh_script_header(script)
+        self._update_script_ui(script)
     
     def _update_script_ui(self, script: Script):
-        """Update the targets list for a script."""
+        """Refresh the target table of a script; cost depends only on the visible rows."""
         if not script.target_frame:
             return
         
-        # Save delay values from existing Entry fields before destroying them
-        self._save_delay_values(script)
+        # Keep the overlay in sync with added, removed and renumbered targets
+        if script.is_editing:
+            self._refresh_overlay()
         
-        # Clear existing target entries
-        for widget in script.target_frame.winfo_children():
-            widget.destroy()
-        
-        # Create entry for each target
-        for i, target in enumerate(script.targets):
-            target_row = tk.Frame(script.target_frame)
-            target_row.pack(fill='x', pady=2)
-            
-            tk.Label(target_row, text=f"{target.number}:", width=5).pack(side='left')
-            
-            # Delay input
-            delay_var = tk.StringVar(value=str(target.delay_ms))
-            delay_entry = tk.Entry(target_row, textvariable=delay_var, width=10)
-            # Store target reference in Entry widget for easy access
-            delay_entry._target_ref = target
-            delay_entry.pack(side='left', padx=5)
-            delay_entry.bind('<FocusOut>', lambda e, t=target, v=delay_var: self._update_target_delay(t, v))
-            delay_entry.bind('<Return>', lambda e, t=target, v=delay_var: self._update_target_delay(t, v))
-            
-            tk.Label(target_row, text="ms").pack(side='left')
-            
-            # Delete button
-            tk.Button(target_row, text="Delete", 
-                     command=lambda t=target: self._delete_target(script, t)).pack(side='left', padx=5)
+        script.target_table.refresh()
+        # Adding, removing or re-anchoring targets changes what the optimizer saves
+        self._show_optimization(script)
         
         # Return delay field (only visible when return is enabled)
-        if script.return_var.get():
-            return_delay_frame = tk.Frame(script.target_frame)
-            return_delay_frame.pack(fill='x', pady=5)
-            
-            tk.Label(return_delay_frame, text="Return delay:", font=('Arial', 10)).pack(side='left', padx=5)
-            
-            return_delay_var = tk.StringVar(value=str(script.return_delay_ms))
-            return_delay_entry = tk.Entry(return_delay_frame, textvariable=return_delay_var, width=10)
-            # Mark this as return delay entry for saving
-            return_delay_entry._return_delay_ref = True
-            return_delay_entry.pack(side='left', padx=5)
-            return_delay_entry.bind('<FocusOut>', lambda e, s=script, v=return_delay_var: self._update_return_delay(s, v))
-            return_delay_entry.bind('<Return>', lambda e, s=script, v=return_delay_var: self._update_return_delay(s, v))
-            
-            tk.Label(return_delay_frame, text="ms", font=('Arial', 10)).pack(side='left', padx=5)
-        
-        # Update keybind button text
-        if script.frame:
-            for widget in script.frame.winfo_children():
-                if isinstance(widget, tk.Frame):
-                    for btn in widget.winfo_children():
-                        if isinstance(btn, tk.Button) and "keybind" in btn.cget('text').lower():
-                            keybind_text = f"Keybind: {self._format_keybind(script.keybind)}" if script.keybind else "Set keybind"
-                            btn.config(text=keybind_text)
-    
-    def _update_target_delay(self, target: Target, var: tk.StringVar):
-        """Update target delay from input."""
-        try:
-            delay = int(var.get())
-            target.delay_ms = delay
-        except ValueError:
-            var.set(str(target.delay_ms))
+        if script.return_mouse:
+            script.return_delay_frame.pack(fill='x', pady=5)
+        else:
+            script.return_delay_frame.pack_forget()
     
     def _update_script_name(self, script: Script):
         """Update script name from input."""
         new_name = script.name_var.get().strip()
         if new_name:
-            script.name = new_name
+            if new_name != script.name:
+                script.name = new_name
+                self._journal('rename', script, name=new_name)
         else:
             # If empty, restore old name
             script.name_var.set(script.name)
@@ -552,24 +1627,202 @@ class AutoclickerApp:
     def _toggle_return(self, script: Script):
         """Toggle return mouse checkbox."""
         script.return_mouse = script.return_var.get()
+        self._journal('set', script, field='return_mouse', value=script.return_mouse)
         # Update UI to show/hide return delay field
         self._update_script_ui(script)
     
+    def _update_overlap_policy(self, script: Script):
+        """Update overlap policy from the option menu."""
+        script.overlap_policy = script.overlap_var.get()
+        self._journal('set', script, field='overlap_policy', value=script.overlap_policy)
+    
+    def _update_repeat_mode(self, script: Script):
+        """Update the repeat mode from the option menu."""
+        script.repeat_mode = script.repeat_var.get()
+        self._journal('set', script, field='repeat_mode', value=script.repeat_mode)
+    
+    def _update_repeat_setting(self, script: Script, field: str, var: tk.StringVar, parse):
+        """Update a non-negative repeat count, duration or rate from input."""
+        try:
+            value = parse(var.get())
+            if value < 0:
+                raise ValueError
+            if value != getattr(script, field):
+                setattr(script, field, value)
+                self._journal('set', script, field=field, value=value)
+                if field == 'target_cps':
+                    self._show_optimization(script)
+        except ValueError:
+            var.set(str(getattr(script, field)))
+    
+    def _toggle_optimize(self, script: Script):
+        """Toggle step coalescing for the script."""
+        script.optimize = script.optimize_var.get()
+        self._journal('set', script, field='optimize', value=script.optimize)
+        self._show_optimization(script)
+    
+    def _show_optimization(self, script: Script):
+        """Show how many backend calls per pass the optimizer saved, or what keeps it off.
+        
+        Never compiles: the count comes from the last plan a run compiled,
+        so refreshing the UI stays cheap and packed scripts stay encoded.
+        """
+        text = ""
+        if script.optimize:
+            blocker = optimization_blocker(script.target_cps, script.anchors, script.waits)
+            plan = script.last_plan
+            if blocker is not None:
+                text = f"off {blocker}"
+            elif plan is not None and plan.optimized:
+                text = f"saves {plan.saved_calls} of {plan.source_steps} calls/pass"
+                if not script.plan_is_current:
+                    text += " (last run)"
+            else:
+                text = "on, counted at the next run"
+        script.optimize_label.config(text=text)
+    
+    def _refresh_rates(self):
+        """Show achieved vs requested click rate of each script while in run mode."""
+        self._rate_refresh = None
+        if not self.is_running:
+            return
+        for script in self.scripts:
+            report = script.live_report
+            if report is None or not script.frame:
+                continue
+            text = f"{report.achieved_cps:.1f}"
+            if report.requested_cps:
+                text += f" / {report.requested_cps:g}"
+            script.rate_label.config(text=f"{text} CPS")
+            self._show_optimization(script)
+        self._rate_refresh = self.root.after(RATE_REFRESH_MS, self._refresh_rates)
+    
+    def _update_backend(self, script: Script):
+        """Switch the script's injection backend from the option menu."""
+        choice = script.backend_var.get()
+        name = None if choice == DEFAULT_BACKEND_CHOICE else choice
+        try:
+            get_backend(name)
+        except (OSError, ImportError) as e:
+            messagebox.showerror("Backend unavailable", f"Cannot use the {choice} backend: {e}")
+            script.backend_var.set(script.backend_name or DEFAULT_BACKEND_CHOICE)
+            return
+        if name != script.backend_name:
+            script.backend_name = name
+            self._journal('set', script, field='backend_name', value=name)
+    
+    def _update_queue_limit(self, script: Script):
+        """Update queue limit from input."""
+        try:
+            limit = int(script.queue_limit_var.get())
+            if limit < 1:
+                raise ValueError
+            if limit != script.queue_limit:
+                script.queue_limit = limit
+                self._journal('set', script, field='queue_limit', value=limit)
+        except ValueError:
+            script.queue_limit_var.set(str(script.queue_limit))
+    
+    def _update_priority(self, script: Script):
+        """Update scheduling priority from input."""
+        try:
+            priority = int(script.priority_var.get())
+            if priority != script.priority:
+                script.priority = priority
+                self._journal('set', script, field='priority', value=priority)
+        except ValueError:
+            script.priority_var.set(str(script.priority))
+    
+    def _sync_return_delay(self, script: Script, var: tk.StringVar):
+        """Store a typed return delay if it is a valid number."""
+        try:
+            script.return_delay_ms = int(var.get())
+        except ValueError:
+            pass
+    
     def _update_return_delay(self, script: Script, var: tk.StringVar):
         """Update return delay from input."""
         try:
             delay = int(var.get())
             script.return_delay_ms = delay
+            self._journal('set', script, field='return_delay_ms', value=delay)
         except ValueError:
             var.set(str(script.return_delay_ms))
     
     def _delete_target(self, script: Script, target: Target):
         """Delete a target from a script."""
-        script.remove_target(target)
+        if target in script.targets:
+            index = script.targets.index(target)
+            script.remove_target(target)
+            self._journal('remove_target', script, t=index)
         self.root.after_idle(self._update_scroll_region)
     
+    def _set_target_delay(self, script: Script, target: Target, delay_ms: int):
+        """Set a target's delay."""
+        if delay_ms != target.delay_ms:
+            target.delay_ms = delay_ms
+            self._journal('delay', script, t=script.targets.index(target), d=delay_ms)
+    
+    def _anchor_targets(self, script: Script, indexes: List[int], anchored: bool):
+        """Capture image anchors for targets from the screen, or drop their anchors."""
+        if not anchored:
+            for index in indexes:
+                if index in script.anchors:
+                    script.set_anchor(index, None)
+                    self._journal('anchor', script, t=index, data=None)
+            self._show_optimization(script)
+            return
+        
+        from vision import ImageAnchor
+        # Keep target markers out of the captured templates
+        if self.overlay is not None:
+            self.overlay.hide()
+        self.root.update()
+        try:
+            for index in indexes:
+                _number, x, y, _delay_ms = script.step_rows(index, index + 1)[0]
+                try:
+                    anchor = ImageAnchor.capture(x, y)
+                except ValueError as e:
+                    messagebox.showerror("Cannot anchor target", f"Target {index + 1}: {e}")
+                    continue
+                except OSError as e:
+                    messagebox.showerror("Cannot anchor target", f"Cannot grab the screen: {e}")
+                    return
+                script.set_anchor(index, anchor)
+                self._journal('anchor', script, t=index, data=anchor.to_dict())
+        finally:
+            self._refresh_overlay()
+            self._show_optimization(script)
+    
+    def _set_target_waits(self, script: Script, indexes: List[int], mode: Optional[str]):
+        """Make targets wait until the screen under them changes or shows a chosen color."""
+        from vision import ScreenWait
+        wait = None
+        if mode == WAIT_COLOR:
+            rgb, _hex = colorchooser.askcolor(title="Wait until the target shows this color", parent=self.root)
+            if rgb is None:
+                return
+            wait = ScreenWait(WAIT_COLOR, color=tuple(int(channel) for channel in rgb))
+        elif mode is not None:
+            wait = ScreenWait(mode)
+        for index in indexes:
+            step_wait = wait.copy() if wait is not None else None
+            if step_wait is None and index not in script.waits:
+                continue
+            script.set_wait(index, step_wait)
+            self._journal('wait', script, t=index, data=step_wait.to_dict() if step_wait is not None else None)
+        self._show_optimization(script)
+    
+    def _on_target_moved(self, target: Target):
+        """Record a finished drag."""
+        script = target.script
+        if script in self.scripts:
+            self._journal('move_target', script, t=script.targets.index(target), x=target.x, y=target.y)
+    
     def _toggle_edit_script(self, script: Script):
         """Toggle edit mode for a script."""
+        previous = self.current_editing_script
         if script.is_editing:
             # Finish editing
             script.set_editing(False)
@@ -582,26 +1835,94 @@ class AutoclickerApp:
             script.set_editing(True)
             self.current_editing_script = script
         
-        self._update_scripts_ui()
-        self._highlight_editing_script()
+        self._refresh_overlay()
+        self._refresh_script_header(script)
+        if previous and previous is not script:
+            self._refresh_script_header(previous)
     
-    def _highlight_editing_script(self):
-        """Highlight the script that is being edited."""
-        for script in self.scripts:
-            if script.frame:
-                if script.is_editing:
-                    script.frame.config(bg='lightyellow', relief='solid', borderwidth=3)
-                else:
-                    script.frame.config(bg='SystemButtonFace', relief='raised', borderwidth=2)
+    def _finish_editing(self):
+        """Finish editing the current script, if any."""
+        if self.current_editing_script:
+            self._toggle_edit_script(self.current_editing_script)
+    
+    def _refresh_overlay(self):
+        """Show the overlay for the script being edited, or hide it."""
+        if self.overlay is None:
+            return
+        if self.current_editing_script:
+            self.overlay.show(self.current_editing_script)
+        else:
+            self.overlay.hide()
     
     def _add_target(self, script: Script):
         """Add a target to a script."""
-        script.add_target()
-        self._update_script_ui(script)
+        target = script.add_target()
+        self._journal('add_targets', script, steps=[[target.x, target.y, target.delay_ms]])
+        if script.target_table:
+            script.target_table.scroll_to_end()
         self.root.after_idle(self._update_scroll_region)
     
+    def _toggle_recording(self, script: Script):
+        """Start recording clicks into the script, or stop if it is being recorded."""
+        if script is self.recording_script:
+            self._stop_recording()
+            return
+        self._stop_recording()
+        
+        recorder = ClickRecorder()
+        try:
+            recorder.start()
+        except Exception as e:
+            messagebox.showerror("Error", f"Cannot record mouse clicks: {e}")
+            return
+        self.recorder = recorder
+        self.recording_script = script
+        self._record_carry_ms = 0
+        self._refresh_script_header(script)
+        self.root.after(RECORD_COMMIT_MS, self._commit_recording)
+    
+    def _stop_recording(self):
+        """Stop recording and commit the clicks still buffered."""
+        script = self.recording_script
+        if script is None:
+            return
+        self.recorder.stop()
+        self._commit_recording()
+        self.status_label.config(text=str(self.recorder.quality))
+        self.recorder = None
+        self.recording_script = None
+        self._refresh_script_header(script)
+    
+    def _commit_recording(self):
+        """Add the clicks recorded since the last commit to the script in one batch."""
+        script = self.recording_script
+        if script is None:
+            return
+        
+        # Clicks on this window (like the Stop recording button) are not targets
+        left, top = self.root.winfo_rootx(), self.root.winfo_rooty()
+        right, bottom = left + self.root.winfo_width(), top + self.root.winfo_height()
+        steps = []
+        for _time, x, y, delay_ms in self.recorder.drain():
+            delay_ms += self._record_carry_ms
+            if self.root.winfo_viewable() and left <= x < right and top <= y < bottom:
+                self._record_carry_ms = delay_ms
+                continue
+            self._record_carry_ms = 0
+            steps.append((x, y, delay_ms))
+        
+        if steps:
+            script.add_targets(steps)
+            self._journal('add_targets', script, steps=[list(step) for step in steps])
+            if script.target_table:
+                script.target_table.scroll_to_end()
+        if self.recorder.active:
+            self.status_label.config(text=str(self.recorder.quality))
+            self.root.after(RECORD_COMMIT_MS, self._commit_recording)
+    
     def _set_keybind(self, script: Script):
         """Set keybind for a script."""
+        import keyboard
         dialog = tk.Toplevel(self.root)
         dialog.title("Set Keybind")
         dialog.geometry("500x400")
@@ -630,17 +1951,8 @@ class AutoclickerApp:
         status_label.pack(pady=15)
         
         def on_press(event):
-            if event.event_type == 'down':
-                key_name = event.name.lower()
-                # Map common key names
-                key_map = {
-                    'left ctrl': 'ctrl', 'right ctrl': 'ctrl',
-                    'left alt': 'alt', 'right alt': 'alt',
-                    'left shift': 'shift', 'right shift': 'shift',
-                    'left windows': 'windows', 'right windows': 'windows',
-                    'left win': 'windows', 'right win': 'windows'
-                }
-                mapped_key = key_map.get(key_name, key_name)
+            if event.event_type == 'down' and event.name:
+                mapped_key = normalize_key(event.name)
                 
                 # Skip if already captured
                 if mapped_key not in captured_keys_list:
@@ -671,7 +1983,9 @@ class AutoclickerApp:
             cleanup()
             if captured_keys_list:
                 script.keybind = captured_keys_list.copy()
-                self._update_scripts_ui()
+                self._journal('keybind', script, keys=script.keybind)
+                self._bind_hotkey(script)
+                self._refresh_script_header(script)
                 dialog.destroy()
             else:
                 status_label.config(text="No keys captured. Please press keys.", fg='orange')
@@ -707,6 +2021,7 @@ class AutoclickerApp:
         """Duplicate a script."""
         new_script = script.duplicate()
         self.scripts.append(new_script)
+        self._journal('duplicate', script)
         self._update_scripts_ui()
     
     def _delete_script(self, script: Script):
@@ -717,21 +2032,51 @@ class AutoclickerApp:
                                     icon='warning')
         if result:
             # Destroy all target windows
-            for target in script.targets:
-                target.destroy()
+            script.destroy_targets()
+            
+            if script is self.recording_script:
+                self._stop_recording()
+            
+            # Stop its executor and hotkey so no more runs start
+            self.hotkeys.unbind(script)
+            self.executors.discard(script)
             
             # Remove from scripts list
             if script in self.scripts:
+                index = self.scripts.index(script)
                 self.scripts.remove(script)
+                self._journal('delete_script', s=index)
             
             # Clear editing reference if this was the editing script
             if self.current_editing_script == script:
                 self.current_editing_script = None
+                self._refresh_overlay()
             
             # Update UI
             self._update_scripts_ui()
             self.root.after_idle(self._update_scroll_region)
     
+    def _toggle_metrics(self):
+        """Show or hide the run metrics panel."""
+        if self.metrics_panel.visible:
+            self.metrics_panel.hide()
+        else:
+            self.metrics_panel.show(before=self.scripts_frame)
+    
+    def _toggle_stall_monitor(self):
+        """Start or stop the event-loop stall monitor from the checkbox."""
+        if self.stall_var.get():
+            self.stall_monitor.start()
+        else:
+            self.stall_monitor.stop()
+    
+    def _report_stall(self, record):
+        """Show a detected UI stall in the status bar and log it."""
+        self.status_label.config(text=str(record))
+        print(record)
+        if record.profile:
+            print(record.profile)
+    
     def _toggle_run(self):
         """Toggle run mode."""
         self.is_running = not self.is_running
@@ -739,113 +2084,239 @@ class AutoclickerApp:
         if self.is_running:
             self.run_button.config(text="Stop", bg='lightcoral')
             self._register_keybinds()
+            self._refresh_rates()
         else:
             self.run_button.config(text="Run", bg='lightgreen')
+            if self._rate_refresh is not None:
+                self.root.after_cancel(self._rate_refresh)
+                self._rate_refresh = None
             self._unregister_keybinds()
+            self._stop_all_scripts()
+    
+    def _stop_all_scripts(self):
+        """Cancel every running and queued script run."""
+        stopped = self.executors.cancel_all()
+        if stopped:
+            # The scheduler thread ends each cancelled run on its next pass and hands
+            # the report to Script.finish_run; read them once that has happened
+            self.root.after(100, lambda: self._show_stop_latency(stopped))
+    
+    def _show_stop_latency(self, scripts: List[Script]):
+        """Show how long the last stop took to halt the given scripts."""
+        latencies = [script.last_report.stop_latency_ms for script in scripts
+                     if script.last_report and script.last_report.stop_latency_ms is not None]
+        if latencies:
+            self.status_label.config(text=f"Stopped {len(latencies)} run(s) in {max(latencies):.1f} ms")
+    
+    def _panic_stop(self):
+        """Stop every running script and leave run mode (called from the keyboard hook)."""
+        self.executors.cancel_all()
+        self.root.after(0, self._leave_run_mode)
+    
+    def _leave_run_mode(self):
+        """Leave run mode if still running."""
+        if self.is_running:
+            self._toggle_run()
     
     def _register_keybinds(self):
-        """Register all keybinds for active scripts."""
-        self._unregister_keybinds()  # Clear existing
-        
+        """Start dispatching hotkeys to their scripts."""
         for script in self.scripts:
-            if script.keybind and len(script.keybind) > 0:
-                # Create hotkey string - keyboard library uses + for combination
-                # Normalize key names
-                normalized = []
-                for key in script.keybind:
-                    key_lower = key.lower()
-                    # Map common variations
-                    if key_lower in ['ctrl', 'control']:
-                        normalized.append('ctrl')
-                    elif key_lower == 'alt':
-                        normalized.append('alt')
-                    elif key_lower == 'shift':
-                        normalized.append('shift')
-                    elif key_lower in ['windows', 'win', 'cmd']:
-                        normalized.append('windows')
-                    else:
-                        # Keep the key as-is (e.g., 'p', 'f1', etc.)
-                        normalized.append(key_lower)
-                
-                hotkey = '+'.join(normalized)
-                try:
-                    def make_handler(s):
-                        return lambda: self._execute_script(s)
-                    hook = keyboard.add_hotkey(hotkey, make_handler(script))
-                    self.keybind_hooks.append((hotkey, hook))
-                except Exception as e:
-                    print(f"Error registering keybind for {script.name}: {e}")
-                    # Try alternative format
-                    try:
-                        hotkey_alt = ' + '.join(normalized)  # Space-separated
-                        hook = keyboard.add_hotkey(hotkey_alt, make_handler(script))
-                        self.keybind_hooks.append((hotkey_alt, hook))
-                    except:
-                        pass
+            if script.keybind:
+                # Compile now so the first hotkey press does not have to
+                script.compile()
+        try:
+            self.hotkeys.start()
+        except Exception as e:
+            print(f"Error installing keyboard hook: {e}")
     
     def _unregister_keybinds(self):
-        """Unregister all keybinds."""
-        for hotkey, hook in self.keybind_hooks:
-            try:
-                keyboard.remove_hotkey(hook)
-            except:
-                pass
-        self.keybind_hooks.clear()
+        """Stop dispatching hotkeys."""
+        try:
+            self.hotkeys.stop()
+        except Exception as e:
+            print(f"Error removing keyboard hook: {e}")
+    
+    def _bind_hotkey(self, script: Script):
+        """Point the script's current keybind at it, replacing its old one."""
+        self.hotkeys.bind(script, script.keybind, lambda: self._execute_script(script))
+    
+    def _rebind_hotkeys(self):
+        """Rebuild every binding after the whole library changed."""
+        self.hotkeys.clear()
+        self.hotkeys.bind(PANIC_HOTKEY, PANIC_HOTKEY.split('+'), self._panic_stop)
+        for script in self.scripts:
+            self._bind_hotkey(script)
     
     def _execute_script(self, script: Script):
-        """Execute a script in a separate thread."""
-        thread = threading.Thread(target=script.execute, daemon=True)
-        thread.start()
+        """Hand a run of the script to its executor, applying the overlap policy."""
+        self.executors.submit(script)
     
     def _save_scripts(self):
-        """Save scripts to JSON file."""
+        """Save scripts to a JSON file or a binary script pack.
+        
+        The library is snapshotted here on the Tk thread, so later edits
+        cannot tear the file; encoding and writing happen in the background.
+        """
+        if self.task is not None:
+            return
         filename = filedialog.asksaveasfilename(
             defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=[("JSON files", "*.json"), ("Script packs", f"*{PACK_EXTENSION}"), ("All files", "*.*")]
         )
         
         if filename:
             try:
-                data = {
-                    'scripts': [script.to_dict() for script in self.scripts]
-                }
-                with open(filename, 'w') as f:
-                    json.dump(data, f, indent=2)
-                messagebox.showinfo("Success", "Scripts saved successfully!")
+                if filename.lower().endswith(PACK_EXTENSION):
+                    self._release_script_pack(filename)
+                snapshot = [(script.settings_dict(), script.to_columns()) for script in self.scripts]
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to save scripts: {e}")
+                return
+            
+            def on_done(saved: bool):
+                self._end_task()
+                if saved:
+                    messagebox.showinfo("Success", "Scripts saved successfully!")
+            
+            def on_error(e: Exception):
+                self._end_task()
+                messagebox.showerror("Error", f"Failed to save scripts: {e}")
+            
+            self._start_task(lambda task: self._write_library(filename, snapshot, task), on_done, on_error)
+    
+    @staticmethod
+    def _write_library(filename: str, snapshot: List[Tuple[Dict[str, Any], Tuple[array, array, array]]],
+                       task: BackgroundTask) -> bool:
+        """Encode a library snapshot and replace the file atomically. Runs on a worker thread."""
+        if filename.lower().endswith(PACK_EXTENSION):
+            return write_pack(filename, snapshot, progress=task.progress, cancel=task.cancel_token)
+        
+        scripts_data = []
+        for done, (settings, columns) in enumerate(snapshot, 1):
+            if task.cancelled:
+                return False
+            scripts_data.append(Script.dict_from_columns(settings, columns))
+            task.progress(done, len(snapshot))
+        data = json.dumps({'scripts': scripts_data}, indent=2).encode('utf-8')
+        if task.cancelled:
+            return False
+        atomic_write(filename, data)
+        return True
+    
+    def _release_script_pack(self, filename: str):
+        """Close the open script pack if it is the file about to be overwritten."""
+        if self.script_pack is None:
+            return
+        if os.path.normcase(os.path.abspath(filename)) != os.path.normcase(os.path.abspath(self.script_pack.path)):
+            return
+        for script in self.scripts:
+            script.detach_pack()
+        self.script_pack.close()
+        self.script_pack = None
     
     def _load_scripts(self):
-        """Load scripts from JSON file."""
+        """Load scripts from a JSON file or a binary script pack.
+        
+        The file is read and parsed into target columns in the background;
+        the Tk thread only swaps in the new scripts, whose targets are
+        materialized on first use.
+        """
+        if self.task is not None:
+            return
         filename = filedialog.askopenfilename(
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=[("Script files", f"*.json *{PACK_EXTENSION}"), ("JSON files", "*.json"),
+                       ("Script packs", f"*{PACK_EXTENSION}"), ("All files", "*.*")]
         )
         
         if filename:
-            try:
-                with open(filename, 'r') as f:
-                    data = json.load(f)
-                
-                # Clear existing scripts and targets
-                for script in self.scripts:
-                    for target in script.targets:
-                        target.destroy()
-                
-                self.scripts.clear()
-                self.current_editing_script = None
-                
-                # Load new scripts
-                for script_data in data.get('scripts', []):
-                    script = Script.from_dict(self, script_data)
-                    self.scripts.append(script)
-                
-                self._update_scripts_ui()
+            def on_done(result: Optional[Tuple[Optional[ScriptPack], List[PackedScript]]]):
+                self._end_task()
+                if result is None:
+                    return
+                pack, entries = result
+                try:
+                    self._replace_library(filename, pack, entries)
+                except Exception as e:
+                    if pack is not None and pack is not self.script_pack:
+                        pack.close()
+                    messagebox.showerror("Error", f"Failed to load scripts: {e}")
+                    return
                 messagebox.showinfo("Success", "Scripts loaded successfully!")
-            except Exception as e:
+            
+            def on_error(e: Exception):
+                self._end_task()
                 messagebox.showerror("Error", f"Failed to load scripts: {e}")
+            
+            self._start_task(lambda task: self._read_library(filename, task), on_done, on_error)
+    
+    @staticmethod
+    def _read_library(filename: str, task: BackgroundTask) -> Optional[Tuple[Optional[ScriptPack], List[PackedScript]]]:
+        """Open a script pack or parse a JSON library. Runs on a worker thread.
+        
+        Returns the open pack (None for JSON) and one entry per script, or
+        None if cancelled.
+        """
+        return read_library(filename, task.progress, task.cancel_token)
+    
+    def _replace_library(self, filename: str, pack: Optional[ScriptPack], entries: List[PackedScript]):
+        """Swap the current scripts for the ones loaded from filename."""
+        self._stop_recording()
+        # Clear existing scripts and targets
+        self.executors.close()
+        for script in self.scripts:
+            script.destroy_targets()
+        
+        self.scripts.clear()
+        self.current_editing_script = None
+        self._refresh_overlay()
+        
+        if self.script_pack is not None:
+            self.script_pack.close()
+        self.script_pack = pack
+        
+        self.scripts.extend(Script.from_packed(self, entry) for entry in entries)
+        self._rebind_hotkeys()
+        self._update_scripts_ui()
+        # Journal where the library came from rather than re-serializing it;
+        # a background compaction then folds it into the snapshot
+        self._journal('load', path=os.path.abspath(filename))
+        self._compact_journal()
+    
+    def _start_task(self, work, on_done, on_error):
+        """Run work(task) in the background with the progress bar and Cancel button shown."""
+        self.task = BackgroundTask(self.root, work, on_done, on_error, on_progress=self._set_progress)
+        self.save_button.config(state='disabled')
+        self.load_button.config(state='disabled')
+        self.progress_bar.config(maximum=1, value=0)
+        self.progress_bar.pack(side='left', padx=5)
+        self.cancel_task_button.config(state='normal')
+        self.cancel_task_button.pack(side='left')
+        self.task.start()
+    
+    def _cancel_task(self):
+        """Stop the background save or load; the file on disk is left unchanged."""
+        if self.task is not None:
+            self.task.cancel()
+            self.cancel_task_button.config(state='disabled')
+    
+    def _end_task(self):
+        """Hide the progress bar once the background task has reported back."""
+        self.task = None
+        self.progress_bar.pack_forget()
+        self.cancel_task_button.pack_forget()
+        self.save_button.config(state='normal')
+        self.load_button.config(state='normal')
+    
+    def _set_progress(self, done: int, total: int):
+        """Advance the progress bar."""
+        self.progress_bar.config(maximum=max(total, 1), value=done)
     
     def _create_tray_icon(self):
         """Create system tray icon."""
+        # Imported here because pystray connects to the display as soon as it loads
+        import pystray
+        from PIL import Image, ImageDraw
+        
         # Create a simple icon
         image = Image.new('RGB', (64, 64), color='gray')
         draw = ImageDraw.Draw(image)
@@ -878,6 +2349,12 @@ class AutoclickerApp:
     def _exit_app(self, icon=None, item=None):
         """Exit the application."""
         self._unregister_keybinds()
+        if self.recorder is not None:
+            self.recorder.stop()
+        self.executors.close()
+        if self.journal is not None:
+            # Every edit is already in the journal; the next start replays it
+            self.journal.close()
         if self.tray_icon:
             self.tray_icon.stop()
         self.root.quit()
@@ -896,7 +2373,35 @@ class AutoclickerApp:
         self.root.mainloop()
 
 
-if __name__ == "__main__":
-    app = AutoclickerApp()
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Autoclicker. Use 'autoclicker.py run -h' for the headless runner.")
+    parser.add_argument('--startup-profile', action='store_true',
+                        help="print how long each startup phase took once the window is up")
+    parser.add_argument('--startup-budget', type=float, metavar='MS',
+                        help="warn (and exit 1 with --exit-after-startup) if the window takes longer to show")
+    parser.add_argument('--exit-after-startup', action='store_true',
+                        help="quit as soon as startup has finished, for measuring cold start")
+    args = parser.parse_args(argv)
+    
+    profile = StartupProfile(budget_ms=args.startup_budget)
+    exit_code = [0]
+    
+    def on_started(startup: StartupProfile):
+        report = startup.to_dict()
+        if args.startup_profile or args.exit_after_startup:
+            print(json.dumps(report, indent=2))
+        if report['over_budget']:
+            print(f"Startup took {report['window_shown_ms']:.0f} ms, over the {startup.budget_ms:g} ms budget",
+                  file=sys.stderr)
+            exit_code[0] = 1
+        if args.exit_after_startup:
+            app.root.after_idle(app.root.quit)
+    
+    app = AutoclickerApp(startup=profile, on_started=on_started)
     app.run()
+    return exit_code[0]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
 
@@ -0,0 +1,263 @@
+"""Input injection backends used to execute scripts.
+
+Scripts never talk to pyautogui directly; they dispatch through an
+InjectionBackend so execution can be measured and tested without a display.
+"""
+import ctypes
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class InjectionBackend:
+    """Interface for backends that move the mouse and click."""
+
+    name = 'base'
+    events_per_click = 1  # Low-level input events one click() produces
+    pause_s = 0.0  # Gap the engine leaves after each click; backends never sleep it themselves
+
+    def position(self) -> Tuple[int, int]:
+        """Return the current mouse position."""
+        raise NotImplementedError
+
+    def move_to(self, x: int, y: int):
+        """Move the mouse to a screen position."""
+        raise NotImplementedError
+
+    def click(self, x: int, y: int, clicks: int = 1):
+        """Move to a screen position and click the left button clicks times."""
+        raise NotImplementedError
+
+    def screen_size(self) -> Tuple[int, int]:
+        """Return the screen size in pixels."""
+        raise NotImplementedError
+
+
+class PyAutoGUIBackend(InjectionBackend):
+    """Backend that injects input through pyautogui."""
+
+    name = 'pyautogui'
+    events_per_click = 3
+
+    def __init__(self):
+        # Imported here because pyautogui needs a display as soon as it loads
+        import pyautogui
+        self._pyautogui = pyautogui
+
+    @property
+    def pause_s(self) -> float:
+        """pyautogui.PAUSE, kept as the gap after each call as it always was.
+        
+        Calls pass _pause=False and the engine schedules the gap instead, so
+        it no longer sleeps on the scheduler thread other scripts share.
+        """
+        return self._pyautogui.PAUSE
+
+    def position(self) -> Tuple[int, int]:
+        x, y = self._pyautogui.position()
+        return x, y
+
+    def move_to(self, x: int, y: int):
+        self._pyautogui.moveTo(x, y, _pause=False)
+
+    def click(self, x: int, y: int, clicks: int = 1):
+        self._pyautogui.click(x, y, clicks=clicks, interval=0, _pause=False)
+
+    def screen_size(self) -> Tuple[int, int]:
+        width, height = self._pyautogui.size()
+        return width, height
+
+
+class XTestBackend(InjectionBackend):
+    """Backend that injects input through the X11 XTest extension via ctypes.
+    
+    A click is queued as motion, press and release and sent with a single
+    flush, without pyautogui's per-call pause and fail-safe checks. Works
+    against any X server, including Xvfb.
+    """
+    
+    name = 'xtest'
+    events_per_click = 3
+    
+    def __init__(self, display: Optional[str] = None):
+        # Imported here because ctypes.util pulls in subprocess, which slows startup
+        import ctypes.util
+        x11_path = ctypes.util.find_library('X11')
+        xtst_path = ctypes.util.find_library('Xtst')
+        if not x11_path or not xtst_path:
+            raise OSError("the XTest backend needs libX11 and libXtst")
+        x11 = ctypes.CDLL(x11_path)
+        xtst = ctypes.CDLL(xtst_path)
+        
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XOpenDisplay.restype = ctypes.c_void_p
+        x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        x11.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        x11.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        x11.XDefaultRootWindow.restype = ctypes.c_ulong
+        x11.XDisplayWidth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDisplayHeight.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XFlush.argtypes = [ctypes.c_void_p]
+        x11.XQueryPointer.argtypes = [ctypes.c_void_p, ctypes.c_ulong,
+                                      ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.c_ulong),
+                                      ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int),
+                                      ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int),
+                                      ctypes.POINTER(ctypes.c_uint)]
+        xtst.XTestQueryExtension.argtypes = [ctypes.c_void_p] + [ctypes.POINTER(ctypes.c_int)] * 4
+        xtst.XTestFakeMotionEvent.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                              ctypes.c_ulong]
+        xtst.XTestFakeButtonEvent.argtypes = [ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_ulong]
+        
+        display = display or os.environ.get('DISPLAY')
+        self._display = x11.XOpenDisplay(display.encode() if display else None)
+        if not self._display:
+            raise OSError(f"cannot open X display {display!r}")
+        
+        unused = ctypes.c_int()
+        if not xtst.XTestQueryExtension(self._display, ctypes.byref(unused), ctypes.byref(unused),
+                                        ctypes.byref(unused), ctypes.byref(unused)):
+            x11.XCloseDisplay(self._display)
+            raise OSError(f"X display {display!r} does not support XTest")
+        
+        self._x11 = x11
+        self._xtst = xtst
+        self._screen = x11.XDefaultScreen(self._display)
+        self._root = x11.XDefaultRootWindow(self._display)
+        # Xlib connections are not thread-safe and scripts run on several threads
+        self._lock = threading.Lock()
+    
+    def position(self) -> Tuple[int, int]:
+        root, child = ctypes.c_ulong(), ctypes.c_ulong()
+        x, y, win_x, win_y = ctypes.c_int(), ctypes.c_int(), ctypes.c_int(), ctypes.c_int()
+        mask = ctypes.c_uint()
+        with self._lock:
+            self._x11.XQueryPointer(self._display, self._root, ctypes.byref(root), ctypes.byref(child),
+                                    ctypes.byref(x), ctypes.byref(y), ctypes.byref(win_x),
+                                    ctypes.byref(win_y), ctypes.byref(mask))
+        return x.value, y.value
+    
+    def move_to(self, x: int, y: int):
+        with self._lock:
+            self._xtst.XTestFakeMotionEvent(self._display, self._screen, x, y, 0)
+            self._x11.XFlush(self._display)
+    
+    def click(self, x: int, y: int, clicks: int = 1):
+        with self._lock:
+            self._xtst.XTestFakeMotionEvent(self._display, self._screen, x, y, 0)
+            for _ in range(clicks):
+                self._xtst.XTestFakeButtonEvent(self._display, 1, True, 0)
+                self._xtst.XTestFakeButtonEvent(self._display, 1, False, 0)
+            self._x11.XFlush(self._display)
+    
+    def screen_size(self) -> Tuple[int, int]:
+        with self._lock:
+            return (self._x11.XDisplayWidth(self._display, self._screen),
+                    self._x11.XDisplayHeight(self._display, self._screen))
+    
+    def close(self):
+        """Close the X display connection."""
+        with self._lock:
+            if self._display:
+                self._x11.XCloseDisplay(self._display)
+                self._display = None
+
+
+class InputEvent:
+    """A single input event captured by the recording backend."""
+
+    __slots__ = ('timestamp', 'kind', 'x', 'y')
+
+    def __init__(self, timestamp: float, kind: str, x: int, y: int):
+        self.timestamp = timestamp
+        self.kind = kind
+        self.x = x
+        self.y = y
+
+    def __repr__(self):
+        return f"InputEvent({self.timestamp:.6f}, {self.kind!r}, {self.x}, {self.y})"
+
+    def to_dict(self) -> Dict[str, object]:
+        """Convert event to dictionary for JSON serialization."""
+        return {'timestamp': self.timestamp, 'kind': self.kind, 'x': self.x, 'y': self.y}
+
+
+class RecordingBackend(InjectionBackend):
+    """In-memory backend that timestamps every event instead of injecting it."""
+
+    name = 'recording'
+
+    def __init__(self, screen_size: Tuple[int, int] = (1920, 1080), clock=time.perf_counter):
+        self.clock = clock
+        self.events: List[InputEvent] = []
+        self._size = screen_size
+        self._position = (screen_size[0] // 2, screen_size[1] // 2)
+        self._lock = threading.Lock()
+
+    def _record(self, kind: str, x: int, y: int, count: int = 1):
+        timestamp = self.clock()
+        with self._lock:
+            self.events.extend(InputEvent(timestamp, kind, x, y) for _ in range(count))
+            self._position = (x, y)
+
+    def position(self) -> Tuple[int, int]:
+        return self._position
+
+    def move_to(self, x: int, y: int):
+        self._record('move', x, y)
+
+    def click(self, x: int, y: int, clicks: int = 1):
+        self._record('click', x, y, clicks)
+
+    def screen_size(self) -> Tuple[int, int]:
+        return self._size
+
+    def clicks(self) -> List[InputEvent]:
+        """Return only the click events."""
+        with self._lock:
+            return [event for event in self.events if event.kind == 'click']
+
+    def clear(self):
+        """Forget all recorded events."""
+        with self._lock:
+            self.events.clear()
+
+
+BACKENDS = {
+    PyAutoGUIBackend.name: PyAutoGUIBackend,
+    XTestBackend.name: XTestBackend,
+    RecordingBackend.name: RecordingBackend
+}
+
+_default_backend: Optional[InjectionBackend] = None
+_named_backends: Dict[str, InjectionBackend] = {}
+_named_lock = threading.Lock()
+
+
+def get_default_backend() -> InjectionBackend:
+    """Return the process-wide backend, creating a pyautogui one on first use."""
+    global _default_backend
+    if _default_backend is None:
+        _default_backend = PyAutoGUIBackend()
+    return _default_backend
+
+
+def set_default_backend(backend: Optional[InjectionBackend]):
+    """Replace the process-wide backend (None restores the pyautogui default)."""
+    global _default_backend
+    _default_backend = backend
+
+
+def get_backend(name: Optional[str] = None) -> InjectionBackend:
+    """Return the shared backend registered under name, or the default backend for None.
+    
+    Raises KeyError for an unknown name and OSError if the backend cannot
+    be used on this machine.
+    """
+    if not name:
+        return get_default_backend()
+    with _named_lock:
+        backend = _named_backends.get(name)
+        if backend is None:
+            backend = _named_backends[name] = BACKENDS[name]()
+        return backend
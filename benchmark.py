@@ -0,0 +1,406 @@
+"""Latency and throughput benchmarks for the script execution path.
+
+Runs Script.execute and AutoclickerApp._execute_script against the in-memory
+RecordingBackend, so it works on a headless machine, and prints the results
+as JSON so runs can be compared for regressions.
+
+Usage: python benchmark.py [--iterations N] [--steps N] [--backend NAME] [--output FILE]
+
+--backend also measures a real injection backend (e.g. xtest). It moves and
+clicks the actual pointer, so point DISPLAY at Xvfb when running it.
+"""
+import argparse
+import json
+import platform
+import sys
+import threading
+import time
+from typing import Any, Dict, List
+
+from autoclicker import RENDER_OVERLAY, AutoclickerApp, Script
+from backends import RecordingBackend, get_backend
+from engine import REPEAT_DURATION
+from executor import OVERLAP_DROP, ExecutorPool
+from hotkeys import HotkeyDispatcher
+from metrics import percentile
+from vision import ImageAnchor, ScreenWait
+
+
+class _BenchHost:
+    """Minimal stand-in for AutoclickerApp used as a script parent."""
+
+    def __init__(self):
+        self.scripts: List[Script] = []
+        self.executors = ExecutorPool()
+        self.render_mode = RENDER_OVERLAY  # Targets create no windows
+
+    def _update_script_ui(self, script: Script):
+        pass
+
+
+def summarize(values_ms: List[float]) -> Dict[str, float]:
+    """Summarize a list of millisecond samples."""
+    return {
+        'count': len(values_ms),
+        'mean': sum(values_ms) / len(values_ms) if values_ms else 0.0,
+        'p50': percentile(values_ms, 50),
+        'p90': percentile(values_ms, 90),
+        'p99': percentile(values_ms, 99),
+        'max': max(values_ms, default=0.0)
+    }
+
+
+def make_script(host: _BenchHost, steps: int, delay_ms: int) -> Script:
+    """Build a script with the given number of steps and a fixed delay."""
+    script = Script(host, f"bench-{steps}x{delay_ms}ms")
+    script.add_targets([(100 + i % 50, 100 + i // 50, delay_ms) for i in range(steps)])
+    host.scripts.append(script)
+    return script
+
+
+def bench_hotkey_latency(host: _BenchHost, iterations: int) -> Dict[str, float]:
+    """Time from the hotkey callback firing to the first injected click."""
+    script = make_script(host, 1, 0)
+    backend = RecordingBackend()
+    script.backend = backend
+    handler = lambda: AutoclickerApp._execute_script(host, script)
+    samples = []
+    for _ in range(iterations):
+        backend.clear()
+        fired = time.perf_counter()
+        handler()
+        deadline = fired + 1.0
+        while not backend.events and time.perf_counter() < deadline:
+            time.sleep(0.0005)
+        if backend.events:
+            samples.append((backend.events[0].timestamp - fired) * 1000.0)
+        # Let the run finish so the next trigger is not dropped
+        while host.executors.get(script).busy:
+            time.sleep(0.0005)
+    return summarize(samples)
+
+
+def bench_throughput(host: _BenchHost, steps: int) -> Dict[str, float]:
+    """Sustained clicks per second with zero delay between steps."""
+    script = make_script(host, steps, 0)
+    backend = RecordingBackend()
+    report = script.execute(backend)
+    clicks = backend.clicks()
+    elapsed = clicks[-1].timestamp - clicks[0].timestamp if len(clicks) > 1 else 0.0
+    return {
+        'clicks': len(clicks),
+        'duration_ms': report.duration_ms,
+        'clicks_per_second': (len(clicks) - 1) / elapsed if elapsed > 0 else 0.0
+    }
+
+
+def bench_backend_rate(host: _BenchHost, name: str, steps: int) -> Dict[str, Any]:
+    """Achieved click and input event rates of a backend with zero delay between steps."""
+    try:
+        backend = get_backend(name)
+    except (KeyError, OSError, ImportError) as e:
+        return {'backend': name, 'error': str(e)}
+    script = make_script(host, steps, 0)
+    report = script.execute(backend)
+    seconds = report.duration_ms / 1000.0
+    return {
+        'backend': name,
+        'clicks': steps,
+        'duration_ms': report.duration_ms,
+        'clicks_per_second': steps / seconds if seconds > 0 else 0.0,
+        'events_per_second': steps * backend.events_per_click / seconds if seconds > 0 else 0.0
+    }
+
+
+def bench_jitter(host: _BenchHost, steps: int, delay_ms: int) -> Dict[str, Any]:
+    """Per-step lateness percentiles and end-of-run drift for a timed script."""
+    script = make_script(host, steps, delay_ms)
+    backend = RecordingBackend()
+    report = script.execute(backend)
+    lateness_ms = [late * 1000.0 for late in report.lateness]
+    expected_ms = steps * delay_ms
+    return {
+        'steps': steps,
+        'delay_ms': delay_ms,
+        'lateness_ms': summarize(lateness_ms),
+        'drift_ms': report.duration_ms - expected_ms
+    }
+
+
+def bench_rate_control(host: _BenchHost, cps: float, duration_ms: int) -> Dict[str, Any]:
+    """Achieved vs requested clicks per second of a rate-controlled repeating run."""
+    script = make_script(host, 10, 0)
+    script.repeat_mode = REPEAT_DURATION
+    script.repeat_duration_ms = duration_ms
+    script.target_cps = cps
+    report = script.execute(RecordingBackend())
+    return {
+        'requested_cps': cps,
+        'achieved_cps': report.achieved_cps,
+        'clicks': report.clicks,
+        'lateness_ms': summarize([late * 1000.0 for late in report.lateness])
+    }
+
+
+def bench_optimizer(host: _BenchHost, steps: int, burst: int) -> Dict[str, Any]:
+    """Backend calls and duration of a script of click bursts, plain and optimized."""
+    script = make_script(host, 0, 0)
+    script.add_targets([(100 + i // burst, 100, 0) for i in range(steps)])
+    results = {}
+    for optimize in (False, True):
+        script.optimize = optimize
+        report = script.execute(RecordingBackend())
+        results['optimized' if optimize else 'plain'] = {
+            'clicks': report.clicks,
+            'backend_calls': report.clicks - report.saved_calls,
+            'duration_ms': report.duration_ms
+        }
+    return results
+
+
+def bench_template_match(iterations: int, moves: int = 20) -> Dict[str, Any]:
+    """Time to locate an image anchor in a synthetic screenshot, after a move and when unmoved."""
+    import numpy as np
+    from PIL import Image
+    rng = np.random.default_rng(0)
+    background = (rng.random((1080, 1920)) * 40).astype(np.uint8)
+    template = Image.fromarray((rng.random((32, 32)) * 255).astype(np.uint8))
+    screen = {}
+    
+    def place(x: int, y: int):
+        image = Image.fromarray(background)
+        image.paste(template, (x, y))
+        screen['image'] = image
+    
+    place(500, 300)
+    anchor = ImageAnchor.capture(516, 316, grab=lambda bbox: screen['image'].crop(bbox))
+    search_ms, cached_ms, found = [], [], 0
+    for dx, dy in rng.integers(-anchor.margin + 10, anchor.margin - 10, (moves, 2)):
+        place(500 + int(dx), 300 + int(dy))
+        match = anchor.locate(516, 316)
+        if match is None or (match.x, match.y) != (516 + dx, 316 + dy):
+            continue
+        found += 1
+        search_ms.append(match.elapsed_ms)
+        for _ in range(max(1, iterations // moves)):
+            cached_ms.append(anchor.locate(516, 316).elapsed_ms)
+    return {
+        'moves': moves,
+        'found': found,
+        'search_ms': summarize(search_ms),
+        'cached_ms': summarize(cached_ms)
+    }
+
+
+def bench_screen_wait(host: _BenchHost, iterations: int, poll_ms: float = 5.0) -> Dict[str, Any]:
+    """Time from a watched region changing to the waiting step's click, and polls spent."""
+    from PIL import Image
+    screen = {'color': (0, 0, 0), 'changed': None}
+    
+    def grab(bbox):
+        return Image.new('RGB', (bbox[2] - bbox[0], bbox[3] - bbox[1]), screen['color'])
+    
+    script = make_script(host, 1, 0)
+    script.add_targets([(100, 100, 0)])
+    script.set_wait(1, ScreenWait(size=16, poll_ms=poll_ms, grab=grab))
+    reaction_ms, polls = [], []
+    for i in range(iterations):
+        screen['color'] = (0, 0, 0)
+        
+        def change():
+            screen['changed'] = time.perf_counter()
+            screen['color'] = (255, 255, 255)
+        
+        # Spread the change across the poll interval
+        timer = threading.Timer(0.02 + (i % 10) * poll_ms / 10000.0, change)
+        timer.start()
+        backend = RecordingBackend()
+        report = script.execute(backend)
+        timer.join()
+        reaction_ms.append((backend.clicks()[-1].timestamp - screen['changed']) * 1000.0)
+        polls.append(report.wait_polls)
+    return {
+        'poll_ms': poll_ms,
+        'reaction_ms': summarize(reaction_ms),
+        'mean_polls': sum(polls) / len(polls) if polls else 0.0
+    }
+
+
+def bench_thread_start(iterations: int) -> Dict[str, Any]:
+    """Cost of starting a thread and of reaching its first instruction."""
+    start_ms = []
+    entry_ms = []
+    for _ in range(iterations):
+        entered = []
+        began = time.perf_counter()
+        thread = threading.Thread(target=lambda: entered.append(time.perf_counter()), daemon=True)
+        thread.start()
+        started = time.perf_counter()
+        thread.join()
+        start_ms.append((started - began) * 1000.0)
+        entry_ms.append((entered[0] - began) * 1000.0)
+    return {'start_ms': summarize(start_ms), 'entry_ms': summarize(entry_ms)}
+
+
+def bench_hotkey_spam(host: _BenchHost, presses: int) -> Dict[str, Any]:
+    """Fire a script's hotkey repeatedly while it runs and count what happens."""
+    script = make_script(host, 20, 1)
+    script.overlap_policy = OVERLAP_DROP
+    backend = RecordingBackend()
+    script.backend = backend
+    threads_before = threading.active_count()
+    for _ in range(presses):
+        AutoclickerApp._execute_script(host, script)
+    threads_peak = threading.active_count()
+    executor = host.executors.get(script)
+    while executor.busy:
+        time.sleep(0.001)
+    return {
+        'presses': presses,
+        'accepted': presses - executor.dropped,
+        'dropped': executor.dropped,
+        'clicks': len(backend.clicks()),
+        'extra_threads': threads_peak - threads_before
+    }
+
+
+def _chord(i: int) -> List[str]:
+    """Return a distinct key combination for every i."""
+    keys = ['f1', 'f2', 'f3', 'f4', 'f5', 'f6', 'f7', 'f8', 'f9', 'f10', 'f11', 'f12']
+    group = i // len(keys)
+    modifiers = [name for bit, name in enumerate(('ctrl', 'alt', 'shift')) if group >> bit & 1]
+    extra = [f"num {group // 8}"] if group >= 8 else []
+    return modifiers + extra + [keys[i % len(keys)]]
+
+
+def bench_hotkey_dispatch(iterations: int, bound_counts=(1, 10, 100, 1000)) -> Dict[str, Any]:
+    """Dispatch latency of the hotkey hook as the number of bound scripts grows.
+    
+    Keys are fed to handle() directly, so the OS hook's delivery delay,
+    which the app's hook adds to the same metric, is not included.
+    """
+    results = {}
+    for bound in bound_counts:
+        dispatcher = HotkeyDispatcher(history=iterations)
+        for i in range(bound):
+            dispatcher.bind(i, _chord(i), lambda: None)
+        # Press the most recently bound chord
+        chord = _chord(bound - 1)
+        for _ in range(iterations):
+            for key in chord:
+                dispatcher.handle(key, True)
+            for key in reversed(chord):
+                dispatcher.handle(key, False)
+        results[str(bound)] = summarize([latency * 1000.0 for latency in dispatcher.latency])
+    return results
+
+
+def bench_concurrency(host: _BenchHost, scripts: int, steps: int, delay_ms: int) -> Dict[str, Any]:
+    """Lateness of many scripts triggered at once, all sharing the scheduler."""
+    backend = RecordingBackend()
+    batch = []
+    for _ in range(scripts):
+        script = make_script(host, steps, delay_ms)
+        script.backend = backend
+        batch.append(script)
+    threads_before = threading.active_count()
+    for script in batch:
+        AutoclickerApp._execute_script(host, script)
+    threads_peak = threading.active_count()
+    for script in batch:
+        while host.executors.get(script).busy:
+            time.sleep(0.001)
+    lateness_ms = [late * 1000.0 for script in batch for late in script.last_report.lateness]
+    return {
+        'scripts': scripts,
+        'clicks': len(backend.clicks()),
+        'lateness_ms': summarize(lateness_ms),
+        'extra_threads': threads_peak - threads_before
+    }
+
+
+def bench_stop_latency(host: _BenchHost, iterations: int) -> Dict[str, Any]:
+    """Time from cancelling a run mid-wait to the run exiting."""
+    script = make_script(host, 10, 1000)
+    script.backend = RecordingBackend()
+    executor = host.executors.get(script)
+    samples = []
+    for _ in range(iterations):
+        executor.submit()
+        time.sleep(0.01)
+        host.executors.cancel_all()
+        while executor.busy:
+            time.sleep(0.0005)
+        if script.last_report and script.last_report.stop_latency_ms is not None:
+            samples.append(script.last_report.stop_latency_ms)
+    return summarize(samples)
+
+
+def bench_load(host: _BenchHost, steps: int) -> Dict[str, Any]:
+    """Time to build a script model from saved data."""
+    data = {
+        'name': 'bench-load',
+        'targets': [{'x': i % 1000, 'y': i // 1000, 'delay_ms': 10} for i in range(steps)]
+    }
+    began = time.perf_counter()
+    script = Script.from_dict(host, data)
+    loaded = time.perf_counter()
+    script.compile()
+    compiled = time.perf_counter()
+    return {
+        'targets': len(script.targets),
+        'from_dict_ms': (loaded - began) * 1000.0,
+        'compile_ms': (compiled - loaded) * 1000.0
+    }
+
+
+def run_benchmarks(iterations: int = 200, steps: int = 2000, backend: str = None) -> Dict[str, Any]:
+    """Run every benchmark and return the results."""
+    host = _BenchHost()
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'timestamp': time.time()
+        },
+        'parameters': {'iterations': iterations, 'steps': steps},
+        'hotkey_to_first_click_ms': bench_hotkey_latency(host, iterations),
+        'throughput': bench_throughput(host, steps),
+        'jitter': bench_jitter(host, 200, 5),
+        'rate_control': bench_rate_control(host, 200.0, 1000),
+        'optimizer': bench_optimizer(host, steps, 10),
+        'template_match': bench_template_match(iterations),
+        'screen_wait': bench_screen_wait(host, min(iterations, 50)),
+        'thread_start': bench_thread_start(iterations),
+        'hotkey_spam': bench_hotkey_spam(host, iterations),
+        'hotkey_dispatch_ms': bench_hotkey_dispatch(iterations),
+        'concurrency_50': bench_concurrency(host, 50, 40, 5),
+        'stop_latency_ms': bench_stop_latency(host, min(iterations, 50)),
+        'load_10k': bench_load(host, 10000)
+    }
+    if backend:
+        results['backend_rate'] = bench_backend_rate(host, backend, steps)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the autoclicker execution path.")
+    parser.add_argument('--iterations', type=int, default=200, help="samples for latency benchmarks")
+    parser.add_argument('--steps', type=int, default=2000, help="steps for the throughput benchmark")
+    parser.add_argument('--backend', help="also measure this injection backend's event rate")
+    parser.add_argument('--output', help="write JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.iterations, args.steps, args.backend)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,584 @@
+"""Execution engine for autoclicker scripts.
+
+Every step of a run is scheduled against an absolute deadline measured from
+the start of the run, so the cost of one click never pushes back the next one.
+"""
+import threading
+import time
+from array import array
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+
+# Default length of the busy-wait window before each deadline.
+DEFAULT_SPIN_MS = 2.0
+
+# How many times a run goes through the script's steps
+REPEAT_ONCE = 'once'                    # A single pass
+REPEAT_COUNT = 'count'                  # repeat_count passes
+REPEAT_DURATION = 'duration'            # Passes until repeat_duration_ms has elapsed
+REPEAT_UNTIL_STOPPED = 'until stopped'  # Passes until the run is cancelled
+REPEAT_MODES = (REPEAT_ONCE, REPEAT_COUNT, REPEAT_DURATION, REPEAT_UNTIL_STOPPED)
+
+# What a step's screen wait (vision.ScreenWait) waits for
+WAIT_CHANGE = 'change'  # The watched region differs from how it looked when the wait began
+WAIT_COLOR = 'color'    # Every cell of the watched region is close to a color
+WAIT_MODES = (WAIT_CHANGE, WAIT_COLOR)
+
+# Per-step timings kept by a report; long repeating runs keep the most recent ones
+MAX_STEP_SAMPLES = 100000
+
+# Script settings passed to ExecutionPlan as keywords under the same names
+PLAN_SETTINGS = ('return_mouse', 'return_delay_ms', 'spin_ms', 'repeat_mode', 'repeat_count',
+                 'repeat_duration_ms', 'target_cps', 'optimize')
+
+
+class CancelToken:
+    """Cancellation flag for a run; waits on it return as soon as it is set."""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.cancelled_at: Optional[float] = None
+        self._event = threading.Event()
+
+    def cancel(self):
+        """Cancel the run. Only the first call is timestamped."""
+        if not self._event.is_set():
+            self.cancelled_at = self.clock()
+            self._event.set()
+
+    def is_set(self) -> bool:
+        """Whether the run has been cancelled."""
+        return self._event.is_set()
+
+    def wait(self, timeout: float) -> bool:
+        """Sleep up to timeout seconds, waking early on cancel. Returns is_set()."""
+        return self._event.wait(timeout)
+
+
+class DeadlineTimer:
+    """Waits for absolute monotonic deadlines with a coarse sleep and a short spin."""
+
+    def __init__(self, spin_ms: float = DEFAULT_SPIN_MS, clock=time.perf_counter):
+        self.spin_s = max(0.0, spin_ms / 1000.0)
+        self.clock = clock
+        self.origin = None
+
+    def start(self) -> float:
+        """Start the run and return its origin timestamp."""
+        self.origin = self.clock()
+        return self.origin
+
+    def wait_until(self, deadline: float, cancel: Optional[CancelToken] = None) -> float:
+        """Block until the deadline and return how late we woke up (seconds).
+        
+        If cancel is given the wait returns as soon as it is set; callers must
+        check it afterwards since the returned lateness is then meaningless.
+        """
+        clock = self.clock
+        remaining = deadline - clock()
+        # Sleep is only accurate to a few ms, so stop short and spin the rest
+        if remaining > self.spin_s:
+            if cancel is None:
+                time.sleep(remaining - self.spin_s)
+            elif cancel.wait(remaining - self.spin_s):
+                return 0.0
+        now = clock()
+        if cancel is None:
+            while now < deadline:
+                now = clock()
+        else:
+            while now < deadline and not cancel.is_set():
+                now = clock()
+        return now - deadline
+
+
+class RateController:
+    """Paces clicks at a requested rate, closing the loop on what was achieved.
+    
+    Clicks land on an ideal grid of origin + n / cps: each one is started
+    early by the measured average injection cost, so it completes on its
+    grid point, and lateness never accumulates because deadlines do not
+    depend on when the previous click ended. After a stall it catches up at
+    most max_catch_up times the requested rate, and a backlog larger than
+    resync_s is forgiven rather than burst out.
+    """
+
+    def __init__(self, cps: float, max_catch_up: float = 2.0, resync_s: float = 1.0):
+        self.cps = cps
+        self.period = 1.0 / cps
+        self.min_gap = self.period / max_catch_up
+        self.resync_s = resync_s
+        self.origin = 0.0
+        self.clicks = 0
+        self.last_start: Optional[float] = None
+        self.mean_cost = 0.0  # Moving average of seconds spent injecting a click
+
+    def start(self, origin: float):
+        """Anchor the grid at the start of the run."""
+        self.origin = origin
+        self.clicks = 0
+        self.last_start = None
+        self.mean_cost = 0.0
+
+    def next_deadline(self) -> float:
+        """When the next click should be injected."""
+        deadline = self.origin + self.clicks * self.period - self.mean_cost
+        if self.last_start is not None:
+            deadline = max(deadline, self.last_start + self.min_gap)
+        return deadline
+
+    def clicked(self, started: float, finished: float):
+        """Record a click injected from started to finished."""
+        if started - (self.origin + self.clicks * self.period) > self.resync_s:
+            # Too far behind to catch up without a burst: restart the grid here
+            self.origin = started - self.clicks * self.period
+        self.clicks += 1
+        self.last_start = started
+        self.mean_cost += ((finished - started) - self.mean_cost) * 0.1
+
+
+class RunReport:
+    """Timing summary of a single script run.
+    
+    Per-step timings are parallel columns: when each step was scheduled
+    (seconds from the start of the run), how late it actually fired and how
+    long the injection call took. Only the last max_steps are kept.
+    """
+
+    def __init__(self, started: float, requested_cps: float = 0.0, clock=time.perf_counter,
+                 max_steps: int = MAX_STEP_SAMPLES):
+        self.started = started
+        self.clock = clock
+        self.max_steps = max_steps
+        self.finished: Optional[float] = None
+        self.cancelled = False
+        self.stop_latency_ms: Optional[float] = None  # Cancel request to run exit
+        self.scheduled = array('d')  # Seconds from the start each kept step was due
+        self.lateness = array('d')  # Seconds each kept step fired after its deadline
+        self.injection = array('d')  # Seconds each kept step spent in the backend
+        self.steps = 0  # Steps fired, including ones no longer kept
+        self.clicks = 0
+        self.passes = 0  # Completed passes through the script
+        self.requested_cps = requested_cps  # 0 when steps follow their own delays
+        self.saved_calls = 0  # Backend calls the optimizer avoided
+        self.match_ms = array('d')  # Time of each kept anchor lookup
+        self.anchor_misses = 0  # Anchored steps skipped because the template was not found
+        self.wait_ms = array('d')  # How long each kept screen wait took to be satisfied
+        self.wait_polls = 0
+        self.wait_timeouts = 0  # Waits that ended the run by timing out
+
+    def record(self, scheduled: float, lateness: float, injection: float = 0.0):
+        """Record the timing of the next step."""
+        if len(self.lateness) >= self.max_steps:
+            # Drop the older half at once so trimming stays amortized O(1)
+            keep = self.max_steps // 2
+            del self.scheduled[:-keep]
+            del self.lateness[:-keep]
+            del self.injection[:-keep]
+        # At most one anchor lookup and one wait per step, so these stay bounded too
+        for column in (self.match_ms, self.wait_ms):
+            if len(column) >= self.max_steps:
+                del column[:-(self.max_steps // 2)]
+        self.scheduled.append(scheduled)
+        self.lateness.append(lateness)
+        self.injection.append(injection)
+        self.steps += 1
+
+    def cancel(self, token: CancelToken, now: float):
+        """Mark the run as cancelled and record how long stopping took."""
+        self.cancelled = True
+        if token.cancelled_at is not None:
+            self.stop_latency_ms = (now - token.cancelled_at) * 1000.0
+
+    def finish(self, now: float):
+        """Mark the run as finished."""
+        self.finished = now
+
+    @property
+    def duration_ms(self) -> float:
+        """Wall-clock duration of the run."""
+        if self.finished is None:
+            return 0.0
+        return (self.finished - self.started) * 1000.0
+
+    @property
+    def achieved_cps(self) -> float:
+        """Clicks per second so far; readable while the run is in progress."""
+        elapsed = (self.finished or self.clock()) - self.started
+        return self.clicks / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def max_lateness_ms(self) -> float:
+        """Worst lateness of any step."""
+        return max(self.lateness, default=0.0) * 1000.0
+
+    @property
+    def mean_lateness_ms(self) -> float:
+        """Average lateness across all steps."""
+        if not self.lateness:
+            return 0.0
+        return sum(self.lateness) / len(self.lateness) * 1000.0
+
+    @property
+    def drift_ms(self) -> float:
+        """How far behind schedule the last step fired."""
+        return self.lateness[-1] * 1000.0 if self.lateness else 0.0
+
+    @property
+    def max_injection_ms(self) -> float:
+        """Slowest backend call."""
+        return max(self.injection, default=0.0) * 1000.0
+
+    @property
+    def mean_injection_ms(self) -> float:
+        """Average time spent in the backend per step."""
+        if not self.injection:
+            return 0.0
+        return sum(self.injection) / len(self.injection) * 1000.0
+
+    def to_dict(self):
+        """Convert report to dictionary for JSON serialization."""
+        return {
+            'duration_ms': self.duration_ms,
+            'steps': self.steps,
+            'cancelled': self.cancelled,
+            'clicks': self.clicks,
+            'passes': self.passes,
+            'saved_calls': self.saved_calls,
+            'anchor_misses': self.anchor_misses,
+            'match_ms': list(self.match_ms),
+            'wait_polls': self.wait_polls,
+            'wait_timeouts': self.wait_timeouts,
+            'wait_ms': list(self.wait_ms),
+            'requested_cps': self.requested_cps,
+            'achieved_cps': self.achieved_cps,
+            'stop_latency_ms': self.stop_latency_ms,
+            'max_lateness_ms': self.max_lateness_ms,
+            'mean_lateness_ms': self.mean_lateness_ms,
+            'drift_ms': self.drift_ms,
+            'max_injection_ms': self.max_injection_ms,
+            'mean_injection_ms': self.mean_injection_ms,
+            'scheduled_ms': [due * 1000.0 for due in self.scheduled],
+            'actual_ms': [(due + late) * 1000.0 for due, late in zip(self.scheduled, self.lateness)],
+            'lateness_ms': [late * 1000.0 for late in self.lateness],
+            'injection_ms': [spent * 1000.0 for spent in self.injection]
+        }
+
+
+def optimize_steps(xs: array, ys: array, delays_ms: array) -> Tuple[array, array, array, array]:
+    """Fold runs of clicks at one position with no delay between them into multi-clicks.
+    
+    Returns x, y, delay_ms and click count columns. Every click keeps its order
+    and deadline; only the number of backend calls drops.
+    """
+    out_xs, out_ys, out_delays_ms, counts = array('i'), array('i'), array('i'), array('i')
+    for x, y, delay_ms in zip(xs, ys, delays_ms):
+        if counts and delay_ms == 0 and x == out_xs[-1] and y == out_ys[-1]:
+            counts[-1] += 1
+        else:
+            out_xs.append(x)
+            out_ys.append(y)
+            out_delays_ms.append(delay_ms)
+            counts.append(1)
+    return out_xs, out_ys, out_delays_ms, counts
+
+
+def optimization_blocker(target_cps: float, anchors, waits) -> Optional[str]:
+    """Return why a plan with these settings cannot be optimized (e.g. "in rate mode"), or None if it can.
+    
+    Rate-controlled plans give every click its own slot on the rate grid, and
+    anchors and waits are keyed by step index, which merging would shift.
+    """
+    if target_cps > 0:
+        return "in rate mode"
+    if anchors:
+        return "with image anchors"
+    if waits:
+        return "with screen waits"
+    return None
+
+
+class ExecutionPlan:
+    """Immutable, array-backed snapshot of a script that runs can execute safely.
+    
+    Steps are stored as parallel read-only integer columns so the run loop never
+    touches the Tk-bound Target objects the UI thread may be editing.
+    
+    With optimize, steps go through optimize_steps and a return move to where
+    the pointer already is gets skipped, unless optimization_blocker() says
+    the settings rule it out.
+    
+    anchors maps step indexes to objects whose locate(x, y) returns where to
+    click instead (anything with x, y and elapsed_ms), or None to skip the click.
+    waits maps step indexes to screen conditions (see vision.ScreenWait) that
+    must hold before the step clicks; its delay is then the minimum wait, and
+    later steps keep their delays relative to when the condition held.
+    """
+
+    __slots__ = ('xs', 'ys', 'delays_ms', 'counts', 'offsets', 'pass_s', 'return_mouse', 'return_delay_s',
+                 'spin_ms', 'repeat_mode', 'repeat_count', 'repeat_duration_s', 'target_cps', 'optimized',
+                 'source_steps', 'anchors', 'waits')
+
+    def __init__(self, xs: array, ys: array, delays_ms: array, return_mouse: bool = False,
+                 return_delay_ms: int = 500, spin_ms: float = DEFAULT_SPIN_MS,
+                 repeat_mode: str = REPEAT_ONCE, repeat_count: int = 1, repeat_duration_ms: int = 0,
+                 target_cps: float = 0.0, optimize: bool = False, anchors: Optional[Dict[int, Any]] = None,
+                 waits: Optional[Dict[int, Any]] = None):
+        self.source_steps = len(xs)
+        self.anchors = dict(anchors) if anchors else None
+        self.waits = dict(waits) if waits else None
+        self.optimized = optimize and optimization_blocker(target_cps, self.anchors, self.waits) is None
+        counts = None
+        if self.optimized:
+            xs, ys, delays_ms, counts = optimize_steps(xs, ys, delays_ms)
+
+        # Deadline of each step in seconds from the start of the run
+        offsets = array('d')
+        total = 0.0
+        for delay_ms in delays_ms:
+            total += delay_ms / 1000.0
+            offsets.append(total)
+
+        self.xs = memoryview(xs).toreadonly()
+        self.ys = memoryview(ys).toreadonly()
+        self.delays_ms = memoryview(delays_ms).toreadonly()
+        self.counts = memoryview(counts).toreadonly() if counts is not None else None  # Clicks per step
+        self.offsets = memoryview(offsets).toreadonly()
+        self.pass_s = total  # Length of one pass when steps follow their delays
+        self.return_mouse = return_mouse
+        self.return_delay_s = return_delay_ms / 1000.0
+        self.spin_ms = spin_ms
+        self.repeat_mode = repeat_mode
+        self.repeat_count = repeat_count
+        self.repeat_duration_s = repeat_duration_ms / 1000.0
+        self.target_cps = target_cps  # 0 keeps each step's own delay
+
+    @classmethod
+    def from_steps(cls, steps: Iterable[Tuple[int, int, int]], **settings) -> 'ExecutionPlan':
+        """Build a plan from (x, y, delay_ms) tuples."""
+        xs, ys, delays_ms = array('i'), array('i'), array('i')
+        for x, y, delay_ms in steps:
+            xs.append(int(x))
+            ys.append(int(y))
+            delays_ms.append(int(delay_ms))
+        return cls(xs, ys, delays_ms, **settings)
+
+    def __len__(self) -> int:
+        return len(self.xs)
+
+    def steps(self) -> Iterable[Tuple[int, int, int]]:
+        """Iterate over (x, y, delay_ms) tuples."""
+        return zip(self.xs, self.ys, self.delays_ms)
+
+    @property
+    def saved_calls(self) -> int:
+        """Backend calls per pass removed by the optimizer."""
+        return self.source_steps - len(self.xs)
+
+    @property
+    def passes(self) -> Optional[int]:
+        """Number of passes to run, or None when the run ends by time or cancellation."""
+        if self.repeat_mode == REPEAT_ONCE:
+            return 1
+        if self.repeat_mode == REPEAT_COUNT:
+            return max(0, self.repeat_count)
+        return None
+
+
+class PlanRun:
+    """One run of a plan, advanced a step at a time by whoever owns the clock.
+    
+    next_deadline() says when the pending click (or the final return move) is
+    due and fire() performs it, so a blocking loop and a shared scheduler can
+    drive runs the same way. Steps repeat as the plan's repeat mode says; with
+    a target rate the step delays are ignored and a RateController paces the
+    clicks.
+    """
+
+    def __init__(self, plan: ExecutionPlan, backend, cancel: Optional[CancelToken] = None,
+                 clock=time.perf_counter):
+        self.plan = plan
+        self.backend = backend
+        self.cancel_token = cancel
+        self.clock = clock
+        self.start_position = backend.position() if plan.return_mouse else None
+        self.origin = clock()
+        self.report = RunReport(self.origin, plan.target_cps, clock)
+        self.finished = False
+        self._rate = None
+        if plan.target_cps > 0:
+            self._rate = RateController(plan.target_cps)
+            self._rate.start(self.origin)
+        self._end = self.origin + plan.repeat_duration_s if plan.repeat_mode == REPEAT_DURATION else None
+        self._base = self.origin  # Start of the current pass
+        self._index = 0  # Next step of the current pass
+        self._last_deadline = self.origin
+        self._last_position: Optional[Tuple[int, int]] = None
+        self._returning = False
+        self._deadline: Optional[float] = None
+        self._resume_at = self.origin  # End of the backend's pause after the last click
+        self._wait_began: Optional[float] = None  # When the pending step started waiting
+        self._wait_reference = None  # Fingerprint taken when the wait began
+
+    def next_deadline(self) -> Optional[float]:
+        """When the pending action is due, or None once the run has finished."""
+        if self.finished:
+            return None
+        if self._deadline is None:
+            deadline = self._compute_deadline()
+            # Nothing is due before the backend's pause after the previous click
+            self._deadline = None if deadline is None else max(deadline, self._resume_at)
+        return self._deadline
+
+    def _compute_deadline(self) -> Optional[float]:
+        plan = self.plan
+        report = self.report
+        if not self._returning:
+            if self._index == len(plan) and len(plan):
+                report.passes += 1
+                self._base += plan.pass_s
+                self._index = 0
+            passes = plan.passes
+            if len(plan) and (passes is None or report.passes < passes):
+                if self._rate is not None:
+                    deadline = self._rate.next_deadline()
+                else:
+                    deadline = self._base + plan.offsets[self._index]
+                if self._end is None or max(deadline, self.clock()) < self._end:
+                    return deadline
+        return self._begin_return()
+
+    def _begin_return(self) -> Optional[float]:
+        """Skip to the final return move; returns when it is due, or None after finishing."""
+        self._returning = True
+        plan = self.plan
+        if self.start_position is not None:
+            if plan.optimized and self._last_position == self.start_position:
+                self.report.saved_calls += 1  # The pointer is already back
+            else:
+                return self._last_deadline + plan.return_delay_s
+        self._finish()
+        return None
+
+    def fire(self) -> float:
+        """Perform the pending action now and return how late it was (seconds)."""
+        deadline = self.next_deadline()
+        if deadline is None:
+            return 0.0
+        clock = self.clock
+        started = clock()
+        lateness = started - deadline
+        self._deadline = None
+        if self._returning:
+            self.backend.move_to(*self.start_position)
+            self.report.record(deadline - self.origin, lateness, clock() - started)
+            self._finish()
+            return lateness
+
+        plan = self.plan
+        index = self._index
+        x, y = plan.xs[index], plan.ys[index]
+        wait = None if plan.waits is None else plan.waits.get(index)
+        if wait is not None:
+            deadline = self._poll_wait(wait, x, y, deadline)
+            if deadline is None:
+                return lateness
+            started = clock()
+            lateness = started - deadline
+        count = 1 if plan.counts is None else plan.counts[index]
+        anchor = None if plan.anchors is None else plan.anchors.get(index)
+        if anchor is not None:
+            match = anchor.locate(x, y)
+            if match is None:
+                self.report.anchor_misses += 1
+                count = 0
+            else:
+                self.report.match_ms.append(match.elapsed_ms)
+                x, y = match.x, match.y
+        if count == 1:
+            self.backend.click(x, y)
+        elif count:
+            self.backend.click(x, y, count)
+            self.report.saved_calls += count - 1
+        ended = clock()
+        self.report.record(deadline - self.origin, lateness, ended - started)
+        if count:
+            self._resume_at = ended + self.backend.pause_s
+        if self._rate is not None:
+            self._rate.clicked(started, ended)
+        self.report.clicks += count
+        if count:
+            self._last_position = (x, y)
+        self._last_deadline = deadline
+        self._index = index + 1
+        return lateness
+
+    def _poll_wait(self, wait, x: int, y: int, deadline: float) -> Optional[float]:
+        """Check a step's wait condition once.
+        
+        Returns when the condition was seen to hold, so the step clicks now,
+        or None after scheduling the next poll or ending the run on timeout.
+        """
+        clock = self.clock
+        report = self.report
+        polled = clock()
+        fingerprint = wait.fingerprint(x, y)
+        now = clock()
+        report.wait_polls += 1
+        if self._wait_began is None:
+            self._wait_began = deadline
+            self._wait_reference = fingerprint
+        if wait.satisfied(fingerprint, self._wait_reference):
+            report.wait_ms.append((now - self._wait_began) * 1000.0)
+            if self._rate is None:
+                # Later steps follow their delays from now, not from the nominal deadline
+                self._base += now - self._wait_began
+            self._wait_began = self._wait_reference = None
+            return now
+        if now - self._wait_began >= wait.timeout_ms / 1000.0:
+            report.wait_timeouts += 1
+            self._wait_began = self._wait_reference = None
+            # The remaining steps are skipped, but the pointer still goes back
+            self._deadline = self._begin_return()
+            return None
+        self._deadline = now + wait.poll_interval(now - polled)
+        return None
+
+    def stop(self):
+        """End the run early because its cancel token was set."""
+        if not self.finished:
+            if self.cancel_token is not None:
+                self.report.cancel(self.cancel_token, self.clock())
+            self._finish()
+
+    def _finish(self):
+        self.finished = True
+        self.report.finish(self.clock())
+
+
+def run_blocking(run: PlanRun, spin_ms: float = DEFAULT_SPIN_MS) -> RunReport:
+    """Drive a run to completion on the calling thread."""
+    timer = DeadlineTimer(spin_ms, run.clock)
+    cancel = run.cancel_token
+    deadline = run.next_deadline()
+    while deadline is not None:
+        timer.wait_until(deadline, cancel)
+        if cancel is not None and cancel.is_set():
+            run.stop()
+            break
+        run.fire()
+        deadline = run.next_deadline()
+    return run.report
+
+
+def execute_plan(plan: ExecutionPlan, backend, cancel: Optional[CancelToken] = None,
+                 on_start: Optional[Callable[[RunReport], None]] = None) -> RunReport:
+    """Click every step of the plan at its deadline and return the timing report.
+    
+    on_start receives the report before the first click so it can be watched
+    live.
+    """
+    run = PlanRun(plan, backend, cancel)
+    if on_start is not None:
+        on_start(run.report)
+    return run_blocking(run, plan.spin_ms)
@@ -0,0 +1,267 @@
+"""Runs scripts when their hotkeys fire, all from one scheduler thread.
+
+Every active run lives in a single heap of step deadlines. One thread waits
+for the earliest deadline and performs the due steps, so injection is
+serialized, steps of simultaneous runs never interleave mid-click, and dozens
+of concurrent scripts cost no extra threads. Each script keeps a lightweight
+ScriptExecutor that applies its overlap policy and queues the next run.
+"""
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from engine import CancelToken, PlanRun
+
+
+# What to do when a script is triggered while it is already running
+OVERLAP_DROP = 'drop'        # Ignore the trigger
+OVERLAP_QUEUE = 'queue'      # Queue the run, up to the script's queue limit
+OVERLAP_RESTART = 'restart'  # Cancel the current run and start over
+OVERLAP_POLICIES = (OVERLAP_DROP, OVERLAP_QUEUE, OVERLAP_RESTART)
+
+
+class _Scheduled:
+    """A run in the scheduler together with how to order and report it."""
+
+    __slots__ = ('run', 'priority', 'on_done', 'seq')
+
+    def __init__(self, run: PlanRun, priority: int, on_done: Callable[[PlanRun], None], seq: int):
+        self.run = run
+        self.priority = priority
+        self.on_done = on_done
+        self.seq = seq
+
+
+class Scheduler:
+    """Single thread executing every run from a heap of step deadlines.
+
+    Steps that fall due together are fired in order of script priority
+    (higher first), then deadline. Waits sleep on a condition until the
+    earliest run's spin window and spin the rest, and wake immediately for new
+    runs or cancellations.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self._heap = []  # (deadline, push order, _Scheduled)
+        self._stopping: List[_Scheduled] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, run: PlanRun, priority: int, on_done: Callable[[PlanRun], None]) -> _Scheduled:
+        """Schedule a run; on_done(run) is called on the scheduler thread when it ends."""
+        entry = _Scheduled(run, priority, on_done, next(self._seq))
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='scheduler', daemon=True)
+                self._thread.start()
+            self._push(entry)
+            self._cond.notify()
+        return entry
+
+    def stop(self, entry: _Scheduled):
+        """End a run whose cancel token has been set without waiting for its next deadline."""
+        with self._cond:
+            self._stopping.append(entry)
+            self._cond.notify()
+
+    def _push(self, entry: _Scheduled):
+        deadline = entry.run.next_deadline()
+        if deadline is None:
+            self._stopping.append(entry)
+        else:
+            heapq.heappush(self._heap, (deadline, next(self._seq), entry))
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._stopping:
+                    self._cond.wait()
+                stopping, self._stopping = self._stopping, []
+                if not stopping:
+                    deadline, _order, head = self._heap[0]
+                    spin_s = max(0.0, head.run.plan.spin_ms / 1000.0)
+                    remaining = deadline - self.clock()
+                    if remaining > spin_s:
+                        # Re-check afterwards: an earlier run or a cancel may have arrived
+                        self._cond.wait(remaining - spin_s)
+                        continue
+            if stopping:
+                for entry in stopping:
+                    self._finish(entry, stop=True)
+                continue
+
+            while self.clock() < deadline:
+                pass
+            with self._cond:
+                now = self.clock()
+                ready = []
+                while self._heap and self._heap[0][0] <= now:
+                    ready.append(heapq.heappop(self._heap)[2])
+            ready.sort(key=lambda entry: (-entry.priority, entry.run.next_deadline() or 0.0, entry.seq))
+
+            for entry in ready:
+                run = entry.run
+                if run.finished:
+                    continue  # Already stopped while it waited
+                try:
+                    run.fire()
+                except Exception as e:
+                    print(f"Error running script step: {e}")
+                    run.stop()
+                if run.next_deadline() is None:
+                    self._finish(entry)
+                else:
+                    with self._cond:
+                        self._push(entry)
+
+    def _finish(self, entry: _Scheduled, stop: bool = False):
+        run = entry.run
+        if stop and not run.finished:
+            run.stop()
+        if entry.on_done is not None:
+            on_done, entry.on_done = entry.on_done, None
+            try:
+                on_done(run)
+            except Exception as e:
+                print(f"Error finishing run: {e}")
+
+
+class ScriptExecutor:
+    """Applies one script's overlap policy and feeds its runs to the scheduler."""
+
+    def __init__(self, start: Callable[[CancelToken], Optional[PlanRun]], scheduler: Scheduler,
+                 name: str = 'script', policy: str = OVERLAP_DROP, queue_limit: int = 1, priority: int = 0,
+                 on_report: Optional[Callable[[PlanRun], None]] = None):
+        self._start = start
+        self.scheduler = scheduler
+        self.name = name
+        self.policy = policy
+        self.queue_limit = queue_limit
+        self.priority = priority
+        self.on_report = on_report
+        self.dropped = 0
+        self._pending = 0
+        self._entry: Optional[_Scheduled] = None
+        self._closed = False
+        self._cancel: Optional[CancelToken] = None
+        self._lock = threading.RLock()
+
+    @property
+    def busy(self) -> bool:
+        """Whether a run is in progress or waiting to start."""
+        with self._lock:
+            return self._entry is not None or self._pending > 0
+
+    def submit(self) -> bool:
+        """Request a run, applying the overlap policy. Returns False if dropped."""
+        with self._lock:
+            if self._closed:
+                return False
+            if self._entry is not None or self._pending:
+                if self.policy == OVERLAP_RESTART:
+                    self._pending = 1
+                    self._stop_current()
+                elif self.policy == OVERLAP_QUEUE and self._pending < self.queue_limit:
+                    self._pending += 1
+                else:
+                    self.dropped += 1
+                    return False
+            else:
+                self._pending = 1
+                self._launch()
+            return True
+
+    def cancel(self) -> bool:
+        """Cancel the current run and forget pending ones. Returns True if a run was stopped."""
+        with self._lock:
+            self._pending = 0
+            return self._stop_current()
+
+    def close(self):
+        """Cancel everything and accept no more runs."""
+        with self._lock:
+            self._closed = True
+            self._pending = 0
+            self._stop_current()
+
+    def _stop_current(self) -> bool:
+        if self._entry is None:
+            return False
+        self._cancel.cancel()
+        self.scheduler.stop(self._entry)
+        return True
+
+    def _launch(self):
+        """Start the next pending run (called with the lock held)."""
+        while self._pending and not self._closed:
+            self._pending -= 1
+            cancel = CancelToken()
+            try:
+                run = self._start(cancel)
+            except Exception as e:
+                print(f"Error running {self.name}: {e}")
+                continue
+            if run is None:
+                continue  # Nothing to run
+            self._cancel = cancel
+            self._entry = self.scheduler.add(run, self.priority, self._finished)
+            return
+
+    def _finished(self, run: PlanRun):
+        with self._lock:
+            self._entry = None
+            self._cancel = None
+            if self.on_report is not None:
+                self.on_report(run)
+            self._launch()
+
+
+class ExecutorPool:
+    """Keeps one ScriptExecutor per script, all sharing one Scheduler."""
+
+    def __init__(self, scheduler: Optional[Scheduler] = None):
+        self.scheduler = scheduler or Scheduler()
+        self._executors: Dict[object, ScriptExecutor] = {}
+        self._lock = threading.Lock()
+
+    def get(self, script) -> ScriptExecutor:
+        """Return the script's executor, synced with its current overlap settings."""
+        with self._lock:
+            executor = self._executors.get(script)
+            if executor is None:
+                executor = ScriptExecutor(lambda cancel: script.start_run(cancel=cancel), self.scheduler,
+                                          script.name, on_report=script.finish_run)
+                self._executors[script] = executor
+        executor.policy = script.overlap_policy
+        executor.queue_limit = script.queue_limit
+        executor.priority = script.priority
+        return executor
+
+    def submit(self, script) -> bool:
+        """Trigger a run of the script."""
+        return self.get(script).submit()
+
+    def discard(self, script):
+        """Stop and forget the script's executor."""
+        with self._lock:
+            executor = self._executors.pop(script, None)
+        if executor is not None:
+            executor.close()
+
+    def cancel_all(self) -> List[object]:
+        """Cancel every in-flight and pending run. Returns the scripts that were running."""
+        with self._lock:
+            items = list(self._executors.items())
+        return [script for script, executor in items if executor.cancel()]
+
+    def close(self):
+        """Stop every executor."""
+        with self._lock:
+            executors = list(self._executors.values())
+            self._executors.clear()
+        for executor in executors:
+            executor.close()
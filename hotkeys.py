@@ -0,0 +1,169 @@
+"""Hotkey dispatch through one low-level keyboard hook.
+
+Instead of one keyboard.add_hotkey per script, a single hook tracks the set
+of pressed keys and looks the chord up in a dict, so the cost of a keystroke
+does not grow with the number of bound scripts.
+"""
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, FrozenSet, Hashable, Iterable, Optional
+
+
+Chord = FrozenSet[str]
+
+# Left/right variants and aliases that should trigger the same hotkey
+KEY_ALIASES = {
+    'left ctrl': 'ctrl', 'right ctrl': 'ctrl', 'control': 'ctrl',
+    'left alt': 'alt', 'right alt': 'alt', 'alt gr': 'alt',
+    'left shift': 'shift', 'right shift': 'shift',
+    'left windows': 'windows', 'right windows': 'windows',
+    'left win': 'windows', 'right win': 'windows', 'win': 'windows', 'cmd': 'windows',
+    'command': 'windows', 'escape': 'esc'
+}
+
+
+def normalize_key(name: str) -> str:
+    """Return the canonical name of a key as reported by the keyboard library."""
+    name = name.lower()
+    return KEY_ALIASES.get(name, name)
+
+
+def normalize_chord(keys: Iterable[str]) -> Chord:
+    """Return the canonical, order-independent form of a key combination."""
+    return frozenset(normalize_key(key) for key in keys)
+
+
+class HotkeyDispatcher:
+    """One keyboard hook dispatching chords to callbacks through a dict lookup.
+    
+    Bindings are keyed by an owner (a script), so changing one keybind only
+    touches that owner's entry. The hook thread reads the index without
+    locking; writers replace the per-chord dicts instead of mutating them.
+    """
+    
+    def __init__(self, clock=time.perf_counter, history: int = 1000,
+                 is_pressed: Optional[Callable[[str], bool]] = None):
+        self.clock = clock
+        # Key state kept by the keyboard library, used to drop keys whose release the hook missed
+        self.is_pressed = is_pressed
+        # Seconds from when the OS reported the key to when its callbacks returned
+        self.latency: Deque[float] = deque(maxlen=history)
+        self._index: Dict[Chord, Dict[Hashable, Callable[[], None]]] = {}
+        self._chords: Dict[Hashable, Chord] = {}
+        self._pressed = set()
+        self._hook = None
+        self._lock = threading.Lock()
+    
+    @property
+    def active(self) -> bool:
+        """Whether the keyboard hook is installed."""
+        return self._hook is not None
+    
+    def bind(self, owner: Hashable, keys: Iterable[str], callback: Callable[[], None]):
+        """Bind owner's chord to callback, replacing any previous binding of owner."""
+        chord = normalize_chord(keys)
+        with self._lock:
+            self._remove(owner)
+            if not chord:
+                return
+            callbacks = dict(self._index.get(chord, {}))
+            callbacks[owner] = callback
+            self._index[chord] = callbacks
+            self._chords[owner] = chord
+    
+    def unbind(self, owner: Hashable):
+        """Remove owner's binding, if any."""
+        with self._lock:
+            self._remove(owner)
+    
+    def clear(self):
+        """Remove every binding."""
+        with self._lock:
+            self._index = {}
+            self._chords.clear()
+    
+    def _remove(self, owner: Hashable):
+        chord = self._chords.pop(owner, None)
+        if chord is None:
+            return
+        callbacks = dict(self._index[chord])
+        del callbacks[owner]
+        if callbacks:
+            self._index[chord] = callbacks
+        else:
+            del self._index[chord]
+    
+    def start(self):
+        """Install the keyboard hook."""
+        if self._hook is None:
+            # Imported here so the dispatcher can be driven without a keyboard device
+            import keyboard
+            self._pressed.clear()
+            if self.is_pressed is None:
+                self.is_pressed = keyboard.is_pressed
+            self._hook = keyboard.hook(self._on_event)
+    
+    def stop(self):
+        """Remove the keyboard hook."""
+        if self._hook is not None:
+            import keyboard
+            try:
+                keyboard.unhook(self._hook)
+            except (KeyError, ValueError):
+                pass
+            self._hook = None
+            self._pressed.clear()
+    
+    def _on_event(self, event):
+        if event.name is not None:
+            received = None
+            if event.time is not None:
+                # The library stamps events with time.time() as the OS delivers them;
+                # carry the hook's delivery delay over to our own clock
+                received = self.clock() - max(0.0, time.time() - event.time)
+            self.handle(event.name, event.event_type == 'down', received)
+    
+    def handle(self, name: str, down: bool, received: Optional[float] = None) -> int:
+        """Process one key event and run the callbacks bound to the resulting chord.
+        
+        received is when the key event happened on the dispatcher's clock,
+        now if not given. Auto-repeat of a held key does not fire again.
+        Returns the number of callbacks run.
+        """
+        if received is None:
+            received = self.clock()
+        key = normalize_key(name)
+        if not down:
+            self._pressed.discard(key)
+            return 0
+        if key in self._pressed:
+            return 0
+        self._pressed.add(key)
+        
+        callbacks = self._index.get(frozenset(self._pressed))
+        if not callbacks and len(self._pressed) > 1:
+            # One missed key-up would otherwise keep every chord from matching
+            stale = {other for other in self._pressed if other != key and not self._still_pressed(other)}
+            if stale:
+                self._pressed -= stale
+                callbacks = self._index.get(frozenset(self._pressed))
+        if not callbacks:
+            return 0
+        for callback in callbacks.values():
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in hotkey callback: {e}")
+        self.latency.append(self.clock() - received)
+        return len(callbacks)
+    
+    def _still_pressed(self, key: str) -> bool:
+        if self.is_pressed is None:
+            return True
+        try:
+            return self.is_pressed(key)
+        except ValueError:
+            # Not a name the library can look up; assume it is still held
+            return True
+
@@ -0,0 +1,204 @@
+"""Bounded history of script runs for live views, export and monitoring hooks."""
+import csv
+import json
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from engine import RunReport
+
+
+SKETCH_POINTS = 101  # Percentiles kept per run for summaries
+
+
+def percentile(values, pct: float) -> float:
+    """Return the pct-th percentile of values using linear interpolation."""
+    if not values:
+        return 0.0
+    return _interpolate(sorted(values), pct)
+
+
+def _interpolate(ordered: Sequence[float], pct: float) -> float:
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def quantile_sketch(values, points: int = SKETCH_POINTS) -> Tuple[List[float], float]:
+    """Summarize values as points percentiles, each the middle of an equal share of weight values.
+    
+    Short sequences are kept whole with a weight of 1.
+    """
+    ordered = sorted(values)
+    if len(ordered) <= points:
+        return ordered, 1.0
+    return ([_interpolate(ordered, 100.0 * (i + 0.5) / points) for i in range(points)],
+            len(ordered) / points)
+
+
+def merged_percentiles(sketches: Sequence[Tuple[List[float], float]], *pcts: float) -> List[float]:
+    """Return percentiles of the values several quantile sketches stand for.
+    
+    Exact, with the same interpolation as percentile(), when every sketch
+    kept its values whole.
+    """
+    if all(weight == 1.0 for _values, weight in sketches):
+        ordered = sorted(value for values, _weight in sketches for value in values)
+        return [_interpolate(ordered, pct) if ordered else 0.0 for pct in pcts]
+    weighted = sorted((value, weight) for values, weight in sketches for value in values)
+    total = sum(weight for _value, weight in weighted)
+    results = []
+    for pct in pcts:
+        target = total * pct / 100.0
+        seen = 0.0
+        for value, weight in weighted:
+            seen += weight
+            if seen >= target:
+                break
+        results.append(value)
+    return results
+
+
+class RunRecord:
+    """A finished run of one script."""
+
+    __slots__ = ('run_id', 'script', 'ended_at', 'report', 'lateness_sketch', 'max_injection_ms')
+
+    def __init__(self, run_id: int, script: str, ended_at: float, report: RunReport):
+        self.run_id = run_id
+        self.script = script
+        self.ended_at = ended_at  # Wall-clock time.time()
+        self.report = report
+        # Set by summarize(): lateness in ms reduced once, so summaries never re-sort every step
+        self.lateness_sketch: Tuple[List[float], float] = ([], 1.0)
+        self.max_injection_ms = 0.0
+
+    def summarize(self):
+        """Reduce the report to what summaries need. O(steps), so kept off the scheduler thread."""
+        self.lateness_sketch = quantile_sketch(late * 1000.0 for late in self.report.lateness)
+        self.max_injection_ms = self.report.max_injection_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert record to dictionary for JSON serialization."""
+        data = {'run_id': self.run_id, 'script': self.script, 'ended_at': self.ended_at}
+        data.update(self.report.to_dict())
+        return data
+
+
+class MetricsStore:
+    """Ring buffer of the most recent runs plus callbacks notified of each one.
+    
+    add() is called from whichever thread finished the run, usually the
+    scheduler thread, so it only queues the run. A worker thread summarizes
+    it, stores it and then calls the subscribers, so neither slow reports
+    nor slow subscribers delay other running scripts.
+    """
+
+    CSV_FIELDS = ('run_id', 'script', 'step', 'scheduled_ms', 'actual_ms', 'lateness_ms', 'injection_ms',
+                  'cancelled')
+
+    def __init__(self, capacity: int = 256):
+        self._records: Deque[RunRecord] = deque(maxlen=capacity)
+        self._callbacks: List[Callable[[RunRecord], None]] = []
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self.version = 0  # Bumped on every change so views can skip redundant redraws
+        self._queue: 'queue.Queue[RunRecord]' = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+
+    def add(self, script: str, report: RunReport) -> RunRecord:
+        """Queue a finished run to be stored and passed to subscribers; returns at once."""
+        with self._lock:
+            record = RunRecord(self._next_id, script, time.time(), report)
+            self._next_id += 1
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._work, name='metrics', daemon=True)
+                self._worker.start()
+        self._queue.put(record)
+        return record
+
+    def join(self):
+        """Wait until every queued run has been stored and its subscribers called."""
+        self._queue.join()
+
+    def _work(self):
+        while True:
+            record = self._queue.get()
+            try:
+                record.summarize()
+                with self._lock:
+                    self._records.append(record)
+                    self.version += 1
+                    callbacks = list(self._callbacks)
+                for callback in callbacks:
+                    try:
+                        callback(record)
+                    except Exception as e:
+                        print(f"Error in metrics callback: {e}")
+            finally:
+                self._queue.task_done()
+
+    def subscribe(self, callback: Callable[[RunRecord], None]):
+        """Call callback(record) for every run added from now on."""
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def unsubscribe(self, callback: Callable[[RunRecord], None]):
+        """Stop calling a subscribed callback."""
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def clear(self):
+        """Forget every stored run."""
+        with self._lock:
+            self._records.clear()
+            self.version += 1
+
+    def records(self, script: Optional[str] = None) -> List[RunRecord]:
+        """Stored runs, oldest first, optionally only those of one script."""
+        with self._lock:
+            records = list(self._records)
+        if script is not None:
+            records = [record for record in records if record.script == script]
+        return records
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Lateness percentiles and run counts per script over the stored runs."""
+        by_script: Dict[str, List[RunRecord]] = {}
+        for record in self.records():
+            by_script.setdefault(record.script, []).append(record)
+        summary = {}
+        for script, records in by_script.items():
+            p50, p99 = merged_percentiles([record.lateness_sketch for record in records], 50, 99)
+            summary[script] = {
+                'runs': len(records),
+                'cancelled': sum(1 for record in records if record.report.cancelled),
+                'p50_lateness_ms': p50,
+                'p99_lateness_ms': p99,
+                'max_injection_ms': max(record.max_injection_ms for record in records),
+                'last_drift_ms': records[-1].report.drift_ms
+            }
+        return summary
+
+    def export_json(self, path: str):
+        """Write every stored run, with per-step timings, as JSON."""
+        with open(path, 'w') as f:
+            json.dump({'runs': [record.to_dict() for record in self.records()]}, f, indent=2)
+
+    def export_csv(self, path: str):
+        """Write one CSV row per stored step."""
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.CSV_FIELDS)
+            for record in self.records():
+                report = record.report
+                first = report.steps - len(report.lateness)  # Steps trimmed from long runs
+                for step, (due, late, spent) in enumerate(zip(report.scheduled, report.lateness,
+                                                              report.injection), first):
+                    writer.writerow((record.run_id, record.script, step, f"{due * 1000.0:.3f}",
+                                     f"{(due + late) * 1000.0:.3f}", f"{late * 1000.0:.3f}",
+                                     f"{spent * 1000.0:.3f}", int(report.cancelled)))
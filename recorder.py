@@ -0,0 +1,113 @@
+"""Records global mouse clicks into script steps.
+
+The mouse hook thread only appends to a deque, which never blocks or drops,
+so fast bursts are kept intact; the Tk thread drains it in batches.
+"""
+import time
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+
+class RecordingQuality:
+    """How faithfully the hook saw the clicks of a recording."""
+
+    __slots__ = ('clicks', 'missed', 'late', 'max_delivery_ms', 'peak_backlog')
+
+    def __init__(self):
+        self.clicks = 0
+        self.missed = 0  # Presses or releases the hook never saw, inferred from their pairing
+        self.late = 0  # Clicks delivered to the hook later than the recorder's late_ms
+        self.max_delivery_ms = 0.0
+        self.peak_backlog = 0  # Most clicks waiting in the buffer at one drain
+
+    def __str__(self):
+        return (f"Recorded {self.clicks} click(s), {self.missed} missed, {self.late} late "
+                f"(max delivery {self.max_delivery_ms:.0f} ms)")
+
+
+class ClickRecorder:
+    """Hooks global left clicks and turns them into (x, y, delay_ms) steps.
+    
+    delay_ms is the measured time since the previous recorded click; the
+    first click of a recording gets no delay.
+    """
+
+    def __init__(self, late_ms: float = 50.0, clock=time.time):
+        self.late_ms = late_ms
+        self.clock = clock  # Must match the clock the mouse library stamps events with
+        self.quality = RecordingQuality()
+        self._buffer: Deque[Tuple[float, int, int]] = deque()
+        self._position: Optional[Tuple[int, int]] = None
+        self._pressed = False
+        self._last_time: Optional[float] = None
+        self._hook = None
+        self._mouse = None
+
+    @property
+    def active(self) -> bool:
+        """Whether the mouse hook is installed."""
+        return self._hook is not None
+
+    def start(self):
+        """Install the global mouse hook."""
+        if self._hook is None:
+            # Imported here because the mouse library hooks the OS on import
+            import mouse
+            self._mouse = mouse
+            self._position = mouse.get_position()
+            self._hook = mouse.hook(self._on_event)
+
+    def stop(self):
+        """Remove the mouse hook; clicks already buffered can still be drained."""
+        if self._hook is not None:
+            try:
+                self._mouse.unhook(self._hook)
+            except ValueError:
+                pass
+            self._hook = None
+
+    def _on_event(self, event):
+        # Runs on the hook thread: do as little as possible
+        mouse = self._mouse
+        if isinstance(event, mouse.MoveEvent):
+            self._position = (event.x, event.y)
+        elif isinstance(event, mouse.ButtonEvent) and event.button == mouse.LEFT:
+            self.feed_button(event.event_type, event.time)
+
+    def feed_move(self, x: int, y: int):
+        """Track the pointer position."""
+        self._position = (x, y)
+
+    def feed_button(self, event_type: str, event_time: float):
+        """Process a left button press ('down' or 'double') or release ('up')."""
+        if event_type == 'up':
+            if not self._pressed:
+                self.quality.missed += 1  # The press was never seen
+            self._pressed = False
+            return
+        if self._pressed:
+            self.quality.missed += 1  # The previous release was never seen
+        self._pressed = True
+        x, y = self._position or (0, 0)
+        self._buffer.append((event_time, x, y))
+
+        delivery_ms = (self.clock() - event_time) * 1000.0
+        if delivery_ms > self.late_ms:
+            self.quality.late += 1
+        if delivery_ms > self.quality.max_delivery_ms:
+            self.quality.max_delivery_ms = delivery_ms
+
+    def drain(self) -> List[Tuple[float, int, int, int]]:
+        """Take every buffered click as (time, x, y, delay_ms), oldest first."""
+        buffer = self._buffer
+        backlog = len(buffer)
+        if backlog > self.quality.peak_backlog:
+            self.quality.peak_backlog = backlog
+        clicks = []
+        for _ in range(backlog):
+            event_time, x, y = buffer.popleft()
+            delay_ms = 0 if self._last_time is None else max(0, round((event_time - self._last_time) * 1000.0))
+            self._last_time = event_time
+            clicks.append((event_time, x, y, delay_ms))
+        self.quality.clicks += len(clicks)
+        return clicks
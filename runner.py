@@ -0,0 +1,130 @@
+"""Headless runner for saved script libraries.
+
+Usage: python autoclicker.py run LIBRARY --script NAME [--repeat N] [--backend NAME] [--report FILE]
+
+Loads a JSON library or script pack and runs one script through the same
+engine the GUI uses, without importing tkinter, pystray or the hotkey hook,
+so it starts quickly and can be driven from cron or other tools. Prints a
+timing summary and exits with one of the EXIT_* codes.
+"""
+import argparse
+import json
+import signal
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from backends import BACKENDS, get_backend
+from engine import PLAN_SETTINGS, REPEAT_COUNT, CancelToken, ExecutionPlan, PlanRun, RunReport, run_blocking
+from metrics import percentile
+from storage import PackedScript, read_library
+
+
+EXIT_OK = 0
+EXIT_ERROR = 1       # Library, script or backend could not be loaded
+EXIT_USAGE = 2       # Bad command line (argparse's own code)
+EXIT_TIMEOUT = 3     # A screen wait timed out
+EXIT_CANCELLED = 130  # Interrupted, as after SIGINT in a shell
+
+
+def find_script(entries: List[PackedScript], name: str) -> Optional[PackedScript]:
+    """Return the library entry of the script called name."""
+    for entry in entries:
+        if entry.metadata.get('name') == name:
+            return entry
+    return None
+
+
+def compile_entry(entry: PackedScript, repeat: Optional[int] = None) -> ExecutionPlan:
+    """Build the execution plan of a library entry, as Script.compile would."""
+    settings = {key: entry.metadata[key] for key in PLAN_SETTINGS if key in entry.metadata}
+    if repeat is not None:
+        settings['repeat_mode'] = REPEAT_COUNT
+        settings['repeat_count'] = repeat
+    if entry.metadata.get('anchors'):
+        from vision import ImageAnchor
+        settings['anchors'] = {data['step']: ImageAnchor.from_dict(data) for data in entry.metadata['anchors']}
+    if entry.metadata.get('waits'):
+        from vision import ScreenWait
+        settings['waits'] = {data['step']: ScreenWait.from_dict(data) for data in entry.metadata['waits']}
+    xs, ys, delays_ms = entry.columns()
+    return ExecutionPlan(xs, ys, delays_ms, **settings)
+
+
+def summarize_report(report: RunReport) -> Dict[str, Any]:
+    """Timing summary of a finished run."""
+    lateness_ms = [late * 1000.0 for late in report.lateness]
+    return {
+        'steps': report.steps,
+        'clicks': report.clicks,
+        'passes': report.passes,
+        'duration_ms': report.duration_ms,
+        'achieved_cps': report.achieved_cps,
+        'lateness_p50_ms': percentile(lateness_ms, 50),
+        'lateness_p99_ms': percentile(lateness_ms, 99),
+        'max_lateness_ms': report.max_lateness_ms,
+        'max_injection_ms': report.max_injection_ms,
+        'cancelled': report.cancelled,
+        'wait_timeouts': report.wait_timeouts,
+        'anchor_misses': report.anchor_misses
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='autoclicker.py run',
+                                     description="Run one script of a saved library without the GUI.")
+    parser.add_argument('library', help="JSON library or script pack")
+    parser.add_argument('--script', required=True, help="name of the script to run")
+    parser.add_argument('--repeat', type=int, help="run this many passes instead of the saved repeat mode")
+    parser.add_argument('--backend', choices=sorted(BACKENDS),
+                        help="injection backend (default: the script's own)")
+    parser.add_argument('--report', help="also write the full run report as JSON to this file")
+    parser.add_argument('--quiet', action='store_true', help="do not print the timing summary")
+    args = parser.parse_args(argv)
+    if args.repeat is not None and args.repeat < 0:
+        parser.error("--repeat must not be negative")
+
+    began = time.perf_counter()
+    pack = None
+    try:
+        pack, entries = read_library(args.library)
+        entry = find_script(entries, args.script)
+        if entry is None:
+            names = ', '.join(repr(entry.metadata.get('name')) for entry in entries) or 'none'
+            print(f"No script named {args.script!r} in {args.library} (scripts: {names})", file=sys.stderr)
+            return EXIT_ERROR
+        plan = compile_entry(entry, args.repeat)
+        backend = get_backend(args.backend or entry.metadata.get('backend_name'))
+    except (OSError, ValueError, KeyError, ImportError) as e:
+        print(f"Cannot run {args.script!r}: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    finally:
+        if pack is not None:
+            pack.close()
+    loaded = time.perf_counter()
+
+    cancel = CancelToken()
+    previous = signal.signal(signal.SIGINT, lambda signum, frame: cancel.cancel())
+    try:
+        run = PlanRun(plan, backend, cancel)
+        report = run_blocking(run, plan.spin_ms)
+    finally:
+        signal.signal(signal.SIGINT, previous)
+
+    summary = summarize_report(report)
+    summary['load_ms'] = (loaded - began) * 1000.0
+    if not args.quiet:
+        print(json.dumps(summary, indent=2))
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report.to_dict(), f, indent=2)
+
+    if report.cancelled:
+        return EXIT_CANCELLED
+    if report.wait_timeouts:
+        return EXIT_TIMEOUT
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""Detects Tk event-loop stalls and names the callback that caused them.
+
+A periodic after() heartbeat measures how late the event loop gets back to
+it. Every Python callback Tk runs is timed (and optionally profiled), so a
+late heartbeat can be pinned on the slowest callback since the previous one.
+
+Enable with the UI toggle or the AUTOCLICKER_STALL_MONITOR environment
+variable: "1" to monitor, "profile" to also capture a cProfile report of the
+offending callback. AUTOCLICKER_STALL_MS sets the threshold.
+"""
+import io
+import os
+import time
+import tkinter
+from collections import deque
+from typing import Deque, Optional
+
+
+ENV_VAR = 'AUTOCLICKER_STALL_MONITOR'
+THRESHOLD_ENV_VAR = 'AUTOCLICKER_STALL_MS'
+
+
+class StallRecord:
+    """One heartbeat that came back later than the threshold."""
+
+    __slots__ = ('at', 'lag_ms', 'callback', 'duration_ms', 'profile')
+
+    def __init__(self, at: float, lag_ms: float, callback: Optional[str], duration_ms: float,
+                 profile: Optional[str]):
+        self.at = at  # Wall-clock time.time()
+        self.lag_ms = lag_ms
+        self.callback = callback  # Slowest callback since the previous heartbeat, if any
+        self.duration_ms = duration_ms
+        self.profile = profile
+
+    def __str__(self):
+        culprit = f"{self.callback} ({self.duration_ms:.0f} ms)" if self.callback else "Tcl or idle tasks"
+        return f"UI stalled {self.lag_ms:.0f} ms in {culprit}"
+
+
+class _TimedCallWrapper(tkinter.CallWrapper):
+    """CallWrapper that lets the active StallMonitor time each callback."""
+
+    monitor: Optional['StallMonitor'] = None
+
+    def __call__(self, *args):
+        monitor = _TimedCallWrapper.monitor
+        if monitor is None or not monitor.enabled:
+            return super().__call__(*args)
+        func = _unwrap(self.func)
+        if func == monitor._beat:
+            return super().__call__(*args)
+        return monitor._time_callback(func, super().__call__, args)
+
+
+def install_callback_timing():
+    """Route Tk callbacks through the timing wrapper.
+    
+    Tk binds each callback when it is registered, so call this before
+    creating the root window.
+    """
+    tkinter.CallWrapper = _TimedCallWrapper
+
+
+def _unwrap(func):
+    """Return the callback passed to after() or after_idle() instead of tkinter's callit wrapper."""
+    code = getattr(func, '__code__', None)
+    if code is None or not func.__qualname__.endswith('after.<locals>.callit'):
+        return func
+    try:
+        return func.__closure__[code.co_freevars.index('func')].cell_contents
+    except (ValueError, TypeError, IndexError):
+        return func
+
+
+def _describe(func) -> str:
+    name = getattr(func, '__qualname__', None) or repr(func)
+    code = getattr(func, '__code__', None)
+    if code is not None and '<lambda>' in name:
+        name += f" ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return name
+
+
+class StallMonitor:
+    """Heartbeat on the Tk event loop that records stalls over a threshold."""
+
+    def __init__(self, root: tkinter.Misc, threshold_ms: float = 100.0, interval_ms: int = 50,
+                 profile: bool = False, capacity: int = 100, clock=time.perf_counter):
+        self.root = root
+        self.threshold_ms = threshold_ms
+        self.interval_ms = interval_ms
+        self.profile = profile
+        self.clock = clock
+        self.enabled = False
+        self.records: Deque[StallRecord] = deque(maxlen=capacity)
+        self.max_lag_ms = 0.0
+        self.on_stall = None  # Called with each StallRecord on the Tk thread
+        self._expected = 0.0
+        self._depth = 0  # Nesting of callbacks, e.g. through update_idletasks
+        self._slowest = None  # (name, seconds, profiler) since the last heartbeat
+
+    @classmethod
+    def from_environment(cls, root: tkinter.Misc) -> 'StallMonitor':
+        """Create a monitor configured, and started if requested, by the environment."""
+        mode = os.environ.get(ENV_VAR, '').strip().lower()
+        try:
+            threshold_ms = float(os.environ.get(THRESHOLD_ENV_VAR, 100))
+        except ValueError:
+            threshold_ms = 100.0
+        monitor = cls(root, threshold_ms, profile=mode == 'profile')
+        if mode and mode not in ('0', 'false', 'off'):
+            monitor.start()
+        return monitor
+
+    def start(self):
+        """Start the heartbeat and callback timing."""
+        if self.enabled:
+            return
+        self.enabled = True
+        self._slowest = None
+        _TimedCallWrapper.monitor = self
+        self._expected = self.clock() + self.interval_ms / 1000.0
+        self.root.after(self.interval_ms, self._beat)
+
+    def stop(self):
+        """Stop monitoring; the pending heartbeat exits on its own."""
+        self.enabled = False
+        if _TimedCallWrapper.monitor is self:
+            _TimedCallWrapper.monitor = None
+
+    def _beat(self):
+        if not self.enabled:
+            return
+        now = self.clock()
+        lag_ms = (now - self._expected) * 1000.0
+        self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+        if lag_ms > self.threshold_ms:
+            self._record(lag_ms)
+        self._slowest = None
+        self._expected = now + self.interval_ms / 1000.0
+        self.root.after(self.interval_ms, self._beat)
+
+    def _record(self, lag_ms: float):
+        name, duration, profiler = self._slowest or (None, 0.0, None)
+        if duration * 1000.0 < lag_ms / 2:
+            # Most of the stall was spent outside Python callbacks, e.g. redrawing
+            name, duration, profiler = None, 0.0, None
+        profile = None
+        if profiler is not None:
+            import pstats
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(15)
+            profile = stream.getvalue()
+        record = StallRecord(time.time(), lag_ms, name, duration * 1000.0, profile)
+        self.records.append(record)
+        if self.on_stall is not None:
+            self.on_stall(record)
+
+    def _time_callback(self, func, call, args):
+        if self._depth:
+            # Nested callbacks are part of the outer one's time
+            return call(*args)
+        self._depth += 1
+        profiler = None
+        if self.profile:
+            # Imported here to keep the profiler off the startup path
+            import cProfile
+            profiler = cProfile.Profile()
+        started = self.clock()
+        try:
+            if profiler is not None:
+                profiler.enable()
+            return call(*args)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            duration = self.clock() - started
+            self._depth -= 1
+            if self._slowest is None or duration > self._slowest[1]:
+                self._slowest = (_describe(func), duration, profiler)
@@ -0,0 +1,412 @@
+"""On-disk formats: compact binary script packs and the autosave change journal.
+
+A pack stores every script's settings in a small JSON index and its targets as
+packed little-endian int32 columns (x, y, delay_ms). Packs are memory-mapped
+and a script's columns are only decoded when it is executed or edited.
+
+Layout:
+    header   magic b'ACPK', u16 version, u16 flags, u32 index length
+    index    UTF-8 JSON: {"scripts": [{"meta": {...}, "count": n, "offset": o}]}
+    padding  to an 8-byte boundary
+    data     per script: xs[n], ys[n], delays_ms[n] as int32, at data start + offset
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+PACK_MAGIC = b'ACPK'
+PACK_VERSION = 1
+PACK_EXTENSION = '.acpack'
+
+_HEADER = struct.Struct('<4sHHI')
+_ITEM_SIZE = 4  # int32
+_NATIVE_LITTLE = sys.byteorder == 'little'
+
+Columns = Tuple[array, array, array]
+
+
+class PackFormatError(ValueError):
+    """Raised when a file is not a valid script pack."""
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _decode(data) -> array:
+    """Decode a little-endian int32 buffer."""
+    column = array('i')
+    column.frombytes(data)
+    if not _NATIVE_LITTLE:
+        column.byteswap()
+    return column
+
+
+def _encode(column: array) -> bytes:
+    """Encode an int32 array as little-endian bytes."""
+    if not _NATIVE_LITTLE:
+        column = array('i', column)
+        column.byteswap()
+    return column.tobytes()
+
+
+class PackedScript:
+    """One script inside a pack; its targets stay encoded until asked for."""
+
+    def __init__(self, pack: Optional['ScriptPack'], metadata: Dict[str, Any], count: int, offset: int):
+        self.pack = pack
+        self.metadata = metadata
+        self.count = count
+        self.offset = offset
+        self._columns: Optional[Columns] = None  # Set once detached from the file
+
+    @classmethod
+    def from_columns(cls, metadata: Dict[str, Any], columns: Columns) -> 'PackedScript':
+        """Wrap columns already in memory, e.g. parsed from a JSON library."""
+        packed = cls(None, metadata, len(columns[0]), 0)
+        packed._columns = columns
+        return packed
+
+    def __len__(self) -> int:
+        return self.count
+
+    def columns(self) -> Columns:
+        """Decode the x, y and delay_ms columns."""
+        return self.read_range(0, self.count)
+
+    def read_range(self, start: int, stop: int) -> Columns:
+        """Decode only the columns of targets start..stop-1."""
+        start = max(0, start)
+        stop = min(stop, self.count)
+        if self._columns is not None:
+            xs, ys, delays_ms = self._columns
+            return xs[start:stop], ys[start:stop], delays_ms[start:stop]
+        return self.pack.read_columns(self.offset, self.count, start, stop)
+
+    def steps(self) -> Iterable[Tuple[int, int, int]]:
+        """Iterate over (x, y, delay_ms) tuples."""
+        return zip(*self.columns())
+
+    def detach(self):
+        """Copy the columns into memory so the pack file can be closed."""
+        if self._columns is None:
+            self._columns = self.columns()
+            self.pack = None
+
+
+class ScriptPack:
+    """A memory-mapped script pack opened for reading."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise PackFormatError(f"{path} is empty")
+        try:
+            self.scripts = self._read_index()
+        except Exception:
+            self.close()
+            raise
+
+    def _read_index(self) -> List[PackedScript]:
+        if len(self._mmap) < _HEADER.size:
+            raise PackFormatError(f"{self.path} is too short to be a script pack")
+        magic, version, _flags, index_length = _HEADER.unpack_from(self._mmap, 0)
+        if magic != PACK_MAGIC:
+            raise PackFormatError(f"{self.path} is not a script pack")
+        if version > PACK_VERSION:
+            raise PackFormatError(f"{self.path} uses pack version {version}, newer than {PACK_VERSION}")
+
+        index_end = _HEADER.size + index_length
+        index = json.loads(bytes(self._mmap[_HEADER.size:index_end]).decode('utf-8'))
+        self._data_start = _align(index_end)
+        return [PackedScript(self, entry['meta'], entry['count'], entry['offset'])
+                for entry in index.get('scripts', [])]
+
+    def read_columns(self, offset: int, count: int, start: int, stop: int) -> Columns:
+        """Decode rows start..stop-1 of the columns stored at offset."""
+        if self._mmap is None:
+            raise ValueError("script pack is closed")
+        base = self._data_start + offset
+        view = memoryview(self._mmap)
+        try:
+            columns = []
+            for column in range(3):
+                column_start = base + (column * count + start) * _ITEM_SIZE
+                columns.append(_decode(view[column_start:column_start + (stop - start) * _ITEM_SIZE]))
+        finally:
+            view.release()
+        return tuple(columns)
+
+    def close(self):
+        """Unmap and close the file."""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+
+def atomic_write(path: str, data: bytes):
+    """Write data to path via a temporary file and rename, so readers never see a partial file."""
+    temp_path = f"{path}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        _remove_quietly(temp_path)
+        raise
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def write_pack(path: str, scripts: Iterable[Tuple[Dict[str, Any], Columns]],
+               progress: Optional[Callable[[int, int], None]] = None, cancel=None) -> bool:
+    """Write (metadata, (xs, ys, delays_ms)) pairs as a script pack.
+    
+    The pack is written to a temporary file and renamed over path, so a crash
+    or cancellation leaves the previous file intact. progress(done, total) is
+    called after each script; cancel is any object with is_set(). Returns
+    False if cancelled before the rename.
+    """
+    scripts = list(scripts)
+    entries = []
+    offset = 0
+    for metadata, (xs, ys, delays_ms) in scripts:
+        if not len(xs) == len(ys) == len(delays_ms):
+            raise ValueError(f"column lengths differ for script {metadata.get('name')!r}")
+        entries.append({'meta': metadata, 'count': len(xs), 'offset': offset})
+        offset += 3 * len(xs) * _ITEM_SIZE
+
+    index = json.dumps({'scripts': entries}, separators=(',', ':')).encode('utf-8')
+    temp_path = f"{path}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(_HEADER.pack(PACK_MAGIC, PACK_VERSION, 0, len(index)))
+            f.write(index)
+            f.write(b'\0' * (_align(_HEADER.size + len(index)) - _HEADER.size - len(index)))
+            for done, (_metadata, columns) in enumerate(scripts, 1):
+                if cancel is not None and cancel.is_set():
+                    break
+                for column in columns:
+                    f.write(_encode(column))
+                if progress is not None:
+                    progress(done, len(scripts))
+            else:
+                f.flush()
+                os.fsync(f.fileno())
+        if cancel is not None and cancel.is_set():
+            _remove_quietly(temp_path)
+            return False
+        os.replace(temp_path, path)
+    except BaseException:
+        _remove_quietly(temp_path)
+        raise
+    return True
+
+
+def columns_from_dict(data: Dict[str, Any]) -> Columns:
+    """Return the target columns of a script in JSON form."""
+    targets = data.get('targets', [])
+    if not isinstance(targets, list) or not all(isinstance(target_data, dict) for target_data in targets):
+        raise ValueError("script targets must be a list of objects")
+    return (array('i', [int(target_data.get('x', 100)) for target_data in targets]),
+            array('i', [int(target_data.get('y', 100)) for target_data in targets]),
+            array('i', [int(target_data.get('delay_ms', 500)) for target_data in targets]))
+
+
+def read_library(path: str, progress: Optional[Callable[[int, int], None]] = None,
+                 cancel=None) -> Optional[Tuple[Optional[ScriptPack], List[PackedScript]]]:
+    """Open a script pack or parse a JSON library.
+    
+    Returns the open pack (None for JSON) and one entry per script, or None
+    if cancel (any object with is_set()) was set. Pack entries only have
+    their index read; targets are decoded when first used.
+    """
+    if path.lower().endswith(PACK_EXTENSION):
+        pack = ScriptPack(path)
+        if cancel is not None and cancel.is_set():
+            pack.close()
+            return None
+        return pack, pack.scripts
+    
+    with open(path, 'r') as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path} is not a script library: expected a JSON object")
+    scripts_data = data.get('scripts', [])
+    if not isinstance(scripts_data, list) or not all(isinstance(script_data, dict) for script_data in scripts_data):
+        raise ValueError(f"{path} is not a script library: 'scripts' must be a list of objects")
+    entries = []
+    for done, script_data in enumerate(scripts_data, 1):
+        if cancel is not None and cancel.is_set():
+            return None
+        settings = {key: value for key, value in script_data.items() if key != 'targets'}
+        entries.append(PackedScript.from_columns(settings, columns_from_dict(script_data)))
+        if progress is not None:
+            progress(done, len(scripts_data))
+    return None, entries
+
+
+class ChangeJournal:
+    """Append-only log of model edits on top of a periodically compacted snapshot.
+    
+    Each edit is one short JSON line flushed as it happens, so autosave costs
+    O(change); compact() rewrites the snapshot and starts a new log. Snapshot
+    and log share a generation number so a crash between the two writes never
+    replays edits that the snapshot already contains.
+    
+    Compaction can also run in three steps so the snapshot is written off the
+    Tk thread: begin_compaction() marks how much of the log the snapshot will
+    contain, write_snapshot() runs on a worker while edits keep being appended
+    to the old log, and end_compaction() starts the new log with those edits.
+    """
+
+    SNAPSHOT_NAME = 'snapshot.json'
+    JOURNAL_NAME = 'journal.jsonl'
+
+    def __init__(self, directory: str, compact_every: int = 500):
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, self.SNAPSHOT_NAME)
+        self.journal_path = os.path.join(directory, self.JOURNAL_NAME)
+        self.compact_every = compact_every
+        self.pending = 0  # Entries written since the last snapshot
+        self.generation = 0
+        self._file = None
+        self._carry: Optional[List[Dict[str, Any]]] = None  # Edits made while a snapshot is written
+
+    def load(self) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Return the last snapshot (or None) and the entries recorded after it."""
+        snapshot = None
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r') as f:
+                snapshot = json.load(f)
+            self.generation = snapshot.get('generation', 0)
+
+        entries = []
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r') as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # A crash mid-write leaves a partial last line
+                        break
+
+        if entries and entries[0] == {'op': 'begin', 'generation': self.generation}:
+            return snapshot, entries[1:]
+        # A crash before end_compaction() leaves the log the snapshot was
+        # taken from; its first entries are already in the snapshot
+        follows = snapshot.get('follows') if snapshot else None
+        if follows and entries and entries[0] == {'op': 'begin', 'generation': follows['generation']}:
+            return snapshot, entries[1 + follows['entries']:]
+        return snapshot, []
+
+    @property
+    def compacting(self) -> bool:
+        """True between begin_compaction() and end_compaction() or abort_compaction()."""
+        return self._carry is not None
+    
+    def resume(self, entries: List[Dict[str, Any]]):
+        """Start appending after the entries load() returned, without a new snapshot.
+        
+        The log is rewritten atomically with just its header and entries, so a
+        partial line left by a crash is dropped instead of being appended to.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        lines = [{'op': 'begin', 'generation': self.generation}] + list(entries)
+        data = ''.join(json.dumps(line, separators=(',', ':')) + '\n' for line in lines).encode('utf-8')
+        # Windows cannot rename over a file that is still open
+        was_open = self._file is not None
+        self.close()
+        try:
+            atomic_write(self.journal_path, data)
+        finally:
+            if was_open or os.path.exists(self.journal_path):
+                self._file = open(self.journal_path, 'a')
+        self.pending = len(entries)
+    
+    def quarantine(self) -> List[str]:
+        """Move the snapshot and log aside as *.bad so an unreadable autosave is kept but not reused.
+        
+        Returns the new paths.
+        """
+        self.close()
+        moved = []
+        for path in (self.snapshot_path, self.journal_path):
+            if os.path.exists(path):
+                os.replace(path, f"{path}.bad")
+                moved.append(f"{path}.bad")
+        return moved
+    
+    def record(self, op: str, **fields) -> bool:
+        """Append one edit. Returns True once the journal is due for compaction."""
+        if self._file is None:
+            return False
+        fields['op'] = op
+        self._file.write(json.dumps(fields, separators=(',', ':')) + '\n')
+        self._file.flush()
+        if self._carry is not None:
+            self._carry.append(fields)
+        self.pending += 1
+        return self.pending >= self.compact_every
+
+    def compact(self, snapshot: Dict[str, Any]):
+        """Replace the snapshot with the current library and start a new journal."""
+        header = self.begin_compaction()
+        try:
+            self.write_snapshot(dict(snapshot, **header))
+        except BaseException:
+            self.abort_compaction()
+            raise
+        self.end_compaction()
+
+    def begin_compaction(self) -> Dict[str, Any]:
+        """Mark the current end of the log as the point the next snapshot is taken at.
+        
+        Returns the header fields to store in that snapshot.
+        """
+        self._carry = []
+        return {'generation': self.generation + 1,
+                'follows': {'generation': self.generation, 'entries': self.pending}}
+
+    def write_snapshot(self, snapshot: Dict[str, Any]):
+        """Encode and write a snapshot made with begin_compaction()'s header. Safe on a worker thread."""
+        os.makedirs(self.directory, exist_ok=True)
+        atomic_write(self.snapshot_path, json.dumps(snapshot, separators=(',', ':')).encode('utf-8'))
+
+    def end_compaction(self):
+        """Start the log of the written snapshot with the edits made while it was written."""
+        carry, self._carry = self._carry, None
+        self.generation += 1
+        try:
+            self.resume(carry)
+        except BaseException:
+            # The old log is still open and the snapshot says how much of it to skip
+            self.generation -= 1
+            raise
+
+    def abort_compaction(self):
+        """Keep appending to the current log after a failed snapshot write."""
+        self._carry = None
+
+    def close(self):
+        """Stop appending."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,170 @@
+"""Headless checks of autosave restore: snapshot, journal replay and recovery."""
+import json
+import os
+
+from autoclicker import RENDER_OVERLAY, AutoclickerApp, Script
+from storage import ChangeJournal
+
+
+class _Root:
+    """Collects after_idle callbacks instead of running a Tk loop."""
+
+    def __init__(self):
+        self.idle = []
+
+    def after_idle(self, callback):
+        self.idle.append(callback)
+
+
+class _Host:
+    """Minimal stand-in for AutoclickerApp that restores and replays autosaves."""
+
+    _restore_autosave = AutoclickerApp._restore_autosave
+    _replay_autosave = AutoclickerApp._replay_autosave
+    _quarantine_autosave = AutoclickerApp._quarantine_autosave
+    _apply_journal_entry = AutoclickerApp._apply_journal_entry
+    _library_snapshot = AutoclickerApp._library_snapshot
+    _compact_journal = AutoclickerApp._compact_journal
+
+    def __init__(self, directory):
+        self.scripts = []
+        self.script_pack = None
+        self.root = _Root()
+        self.render_mode = RENDER_OVERLAY  # Targets create no windows
+        self.journal = ChangeJournal(directory)
+
+    def _update_script_ui(self, script):
+        pass
+
+    def _update_scripts_ui(self):
+        pass
+
+    def _rebind_hotkeys(self):
+        pass
+
+
+def _rows(script):
+    return [(x, y, delay_ms) for _, x, y, delay_ms in script.step_rows(0, script.target_count)]
+
+
+def test_round_trip(tmp_path):
+    directory = str(tmp_path)
+    host = _Host(directory)
+    host._restore_autosave()
+
+    # Record a snapshot, then edits on top of it
+    script = Script(host, 'Farm')
+    script.add_targets([(10, 20, 100), (30, 40, 200)])
+    host.scripts.append(script)
+    host.journal.compact(host._library_snapshot())
+    host.journal.record('add_targets', s=0, steps=[[50, 60, 300]])
+    host.journal.record('move_target', s=0, t=0, x=11, y=21)
+    host.journal.record('delay', s=0, t=1, d=250)
+    host.journal.record('set', s=0, field='target_cps', value=20.0)
+    host.journal.record('rename', s=0, name='Farm 2')
+    host.journal.close()
+
+    restored = _Host(directory)
+    restored._restore_autosave()
+    assert restored.journal is not None
+    assert [s.name for s in restored.scripts] == ['Farm 2']
+    assert restored.scripts[0].target_cps == 20.0
+    assert _rows(restored.scripts[0]) == [(11, 21, 100), (30, 40, 250), (50, 60, 300)]
+    # Nothing is rewritten at startup below the compaction threshold
+    assert restored.root.idle == []
+    assert restored.journal.pending == 5
+
+    # New edits append after the replayed ones and survive another restart
+    restored.journal.record('rename', s=0, name='Farm 3')
+    restored.journal.close()
+    again = _Host(directory)
+    again._restore_autosave()
+    assert [s.name for s in again.scripts] == ['Farm 3']
+    assert _rows(again.scripts[0]) == [(11, 21, 100), (30, 40, 250), (50, 60, 300)]
+
+
+def test_partial_line_is_dropped(tmp_path):
+    directory = str(tmp_path)
+    host = _Host(directory)
+    host._restore_autosave()
+    host.journal.record('add_script', data=Script(host, 'A').to_dict())
+    host.journal.close()
+    with open(os.path.join(directory, ChangeJournal.JOURNAL_NAME), 'a') as f:
+        f.write('{"op":"rena')
+
+    restored = _Host(directory)
+    restored._restore_autosave()
+    restored.journal.record('rename', s=0, name='B')
+    restored.journal.close()
+
+    again = _Host(directory)
+    again._restore_autosave()
+    assert [s.name for s in again.scripts] == ['B']
+
+
+def test_bad_autosave_is_kept_aside(tmp_path):
+    directory = str(tmp_path)
+    host = _Host(directory)
+    host._restore_autosave()
+    host.scripts.append(Script(host, 'Keep me'))
+    host.journal.compact(host._library_snapshot())
+    host.journal.record('rename', s=3, name='No such script')
+    host.journal.close()
+    with open(os.path.join(directory, ChangeJournal.SNAPSHOT_NAME)) as f:
+        snapshot = f.read()
+
+    restored = _Host(directory)
+    restored._restore_autosave()
+    assert restored.journal is None
+    assert restored.scripts == []
+    assert len(restored.root.idle) == 1  # The warning dialog
+    assert sorted(os.listdir(directory)) == ['journal.jsonl.bad', 'snapshot.json.bad']
+    with open(os.path.join(directory, 'snapshot.json.bad')) as f:
+        assert f.read() == snapshot
+    with open(os.path.join(directory, 'journal.jsonl.bad')) as f:
+        assert json.loads(f.readlines()[-1])['s'] == 3
+
+
+def test_crash_while_compacting(tmp_path):
+    directory = str(tmp_path)
+    host = _Host(directory)
+    host._restore_autosave()
+    host.scripts.append(Script(host, 'A'))
+    host.journal.record('add_script', data=host.scripts[0].to_dict())
+
+    # The snapshot is written but the process dies before the new log starts
+    header = host.journal.begin_compaction()
+    snapshot = host._library_snapshot()
+    host.journal.record('rename', s=0, name='B')
+    host.journal.write_snapshot(dict(snapshot, **header))
+    host.journal.close()
+
+    restored = _Host(directory)
+    restored._restore_autosave()
+    assert [s.name for s in restored.scripts] == ['B']
+    restored.journal.record('rename', s=0, name='C')
+    restored.journal.close()
+
+    again = _Host(directory)
+    again._restore_autosave()
+    assert [s.name for s in again.scripts] == ['C']
+
+
+def test_loaded_library_is_replayed_from_its_file(tmp_path):
+    directory = str(tmp_path / 'autosave')
+    library = tmp_path / 'library.json'
+    library.write_text(json.dumps({'scripts': [
+        {'name': 'Loaded', 'targets': [{'x': 1, 'y': 2, 'delay_ms': 3}]}]}))
+    host = _Host(directory)
+    host._restore_autosave()
+    host.journal.record('add_script', data=Script(host, 'Old').to_dict())
+    host.journal.record('load', path=str(library))
+    host.journal.record('delay', s=0, t=0, d=30)
+    host.journal.close()
+
+    restored = _Host(directory)
+    restored._restore_autosave()
+    assert [s.name for s in restored.scripts] == ['Loaded']
+    assert _rows(restored.scripts[0]) == [(1, 2, 30)]
+    # Folded into a snapshot once the Tk loop is idle
+    assert restored.root.idle == [restored._compact_journal]
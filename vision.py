@@ -0,0 +1,359 @@
+"""Template matching for image-anchored targets.
+
+An anchored target stores a small grayscale template of what was under its
+click point. Before each click the template is searched for in a bounded
+region around the recorded position, so the target follows its window when
+it moves. Matching is zero-mean normalized cross-correlation computed with
+numpy over all window positions at once:
+
+1. Around the last match, at full resolution (usually enough on its own).
+2. Over the whole search region on a downsampled pyramid level, then refined
+   at full resolution in the neighborhood of the best few coarse candidates.
+   Downsampling is not shift invariant, so the coarse level matches one
+   template per alignment of the target against the 2**levels pixel grid.
+
+ScreenWait holds a step back until a small watched region changes or shows
+a color, comparing cheap downsampled fingerprints instead of full pixels.
+
+Only the part of the screen being searched is grabbed. Everything takes a
+grab(bbox) callable, so tests can match against synthetic screenshots.
+"""
+import base64
+import io
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from PIL import Image
+
+from engine import WAIT_CHANGE, WAIT_COLOR, WAIT_MODES
+
+Box = Tuple[int, int, int, int]  # left, top, right, bottom in screen pixels
+Grab = Callable[[Box], Image.Image]
+
+
+def grab_screen(bbox: Box) -> Image.Image:
+    """Grab a region of the screen."""
+    # Imported here because ImageGrab needs a display on some platforms
+    from PIL import ImageGrab
+    return ImageGrab.grab(bbox=bbox)
+
+
+def to_gray(image) -> np.ndarray:
+    """Convert a PIL image or array to a float32 grayscale array."""
+    if isinstance(image, Image.Image):
+        image = image.convert('L')
+    array = np.asarray(image, dtype=np.float32)
+    if array.ndim == 3:
+        array = array[..., :3].mean(axis=2)
+    return array
+
+
+def downsample(image: np.ndarray, levels: int) -> np.ndarray:
+    """Halve the resolution levels times by averaging 2x2 blocks."""
+    for _ in range(levels):
+        height, width = image.shape[0] // 2 * 2, image.shape[1] // 2 * 2
+        image = image[:height, :width].reshape(height // 2, 2, width // 2, 2).mean(axis=(1, 3))
+    return image
+
+
+def match_scores(image: np.ndarray, templates: np.ndarray) -> np.ndarray:
+    """Normalized cross-correlation of a template at every position of image.
+
+    templates is one (h, w) template or a stack of n same-sized ones. Returns
+    a (H - h + 1, W - w + 1) array, or (n, ...) for a stack, in [-1, 1];
+    flat windows score 0.
+    """
+    height, width = templates.shape[-2:]
+    if image.shape[0] < height or image.shape[1] < width:
+        return np.zeros(templates.shape[:-2] + (0, 0), dtype=np.float32)
+    centered = templates - templates.mean(axis=(-2, -1), keepdims=True)
+    template_norms = np.sqrt((centered * centered).sum(axis=(-2, -1)))[..., None, None]
+    windows = sliding_window_view(image, (height, width))
+    # sum((window - mean) * centered) == sum(window * centered) since centered sums to 0
+    cross = np.einsum('ijkl,...kl->...ij', windows, centered, optimize=True)
+
+    # Window variances from summed-area tables
+    image = image.astype(np.float64)
+    sums = _window_sums(image, height, width)
+    squares = _window_sums(image * image, height, width)
+    variance = np.maximum(squares - sums * sums / (height * width), 0.0)
+    denominator = (np.sqrt(variance) * template_norms).astype(np.float32)
+    scores = np.zeros_like(cross)
+    np.divide(cross, denominator, out=scores, where=denominator > 1e-6)
+    return scores
+
+
+def _window_sums(image: np.ndarray, height: int, width: int) -> np.ndarray:
+    integral = np.pad(image.cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+    return (integral[height:, width:] - integral[:-height, width:]
+            - integral[height:, :-width] + integral[:-height, :-width])
+
+
+class Match:
+    """Where a template was found, as the screen position of its center."""
+
+    __slots__ = ('x', 'y', 'score', 'elapsed_ms', 'cached')
+
+    def __init__(self, x: int, y: int, score: float, elapsed_ms: float, cached: bool):
+        self.x = x
+        self.y = y
+        self.score = score
+        self.elapsed_ms = elapsed_ms  # Grab plus matching time
+        self.cached = cached  # Found near the last match without a full search
+
+    def __repr__(self):
+        return f"Match({self.x}, {self.y}, score={self.score:.3f}, {self.elapsed_ms:.2f} ms, cached={self.cached})"
+
+
+class TemplateMatcher:
+    """Finds one template in screen regions, remembering where it was last seen."""
+
+    def __init__(self, template, threshold: float = 0.9, max_levels: int = 3, min_size: int = 6,
+                 cache_radius: int = 4, candidates: int = 4, grab: Optional[Grab] = None,
+                 clock=time.perf_counter):
+        self.template = to_gray(template)
+        height, width = self.template.shape
+        if self.template.std() < 1.0:
+            raise ValueError("template has no detail to match")
+        self.threshold = threshold
+        self.cache_radius = cache_radius
+        self.candidates = candidates  # Coarse positions refined at full resolution
+        self.grab = grab or grab_screen
+        self.clock = clock
+        self.last: Optional[Tuple[int, int]] = None  # Top-left of the last match
+
+        # Coarsest level that still leaves min_size pixels of template at every alignment
+        self.levels = 0
+        while (self.levels < max_levels
+               and (min(height, width) - (2 << self.levels) + 1) >> (self.levels + 1) >= min_size):
+            self.levels += 1
+        # One coarse template per (row, column) shift of the target against the
+        # grid: the template cropped so the shifted corner falls on a grid line
+        scale = 1 << self.levels
+        coarse_height = (height - scale + 1) >> self.levels << self.levels
+        coarse_width = (width - scale + 1) >> self.levels << self.levels
+        self._shifts = np.array([(row, column) for row in range(scale) for column in range(scale)])
+        self._coarse = np.stack([downsample(self.template[row:row + coarse_height, column:column + coarse_width],
+                                            self.levels) for row, column in self._shifts])
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """Template width and height."""
+        height, width = self.template.shape
+        return width, height
+
+    def find(self, region: Box) -> Optional[Match]:
+        """Search region for the template. Returns None if nothing scores above threshold."""
+        started = self.clock()
+        found, cached = None, False
+        if self.last is not None and _contains(region, self.last, self.size):
+            found = self._search_near(self.last, self.cache_radius, region)
+            cached = found is not None
+        if found is None:
+            found = self._search(region)
+        if found is None:
+            return None
+        (left, top), score = found
+        self.last = (left, top)
+        width, height = self.size
+        return Match(left + width // 2, top + height // 2, score, (self.clock() - started) * 1000.0, cached)
+
+    def _search_near(self, position: Tuple[int, int], radius: int, region: Box):
+        """Full-resolution search within radius pixels of a top-left position."""
+        width, height = self.size
+        left = max(region[0], position[0] - radius)
+        top = max(region[1], position[1] - radius)
+        right = min(region[2], position[0] + radius + width)
+        bottom = min(region[3], position[1] + radius + height)
+        return self._best(self.grab((left, top, right, bottom)), (left, top))
+
+    def _best(self, image, origin: Tuple[int, int]):
+        scores = match_scores(to_gray(image), self.template)
+        if not scores.size:
+            return None
+        row, column = np.unravel_index(int(scores.argmax()), scores.shape)
+        score = float(scores[row, column])
+        if score < self.threshold:
+            return None
+        return (origin[0] + int(column), origin[1] + int(row)), score
+
+    def _search(self, region: Box):
+        """Coarse-to-fine search of the whole region."""
+        image = to_gray(self.grab(region))
+        if not self.levels:
+            return self._best(image, region[:2])
+        scores = match_scores(downsample(image, self.levels), self._coarse)
+        flat = scores.ravel()
+        if not flat.size:
+            return None
+        count = min(self.candidates, flat.size)
+        best = np.argpartition(flat, -count)[-count:]
+        best = best[np.argsort(flat[best])[::-1]]
+
+        # Refine the best candidates in the full-resolution region already grabbed
+        scale = 1 << self.levels
+        width, height = self.size
+        found = None
+        for shift, row, column in zip(*np.unravel_index(best, scores.shape)):
+            row_shift, column_shift = self._shifts[shift]
+            top = max(0, int(row) * scale - int(row_shift) - 1)
+            left = max(0, int(column) * scale - int(column_shift) - 1)
+            patch = image[top:top + height + 2, left:left + width + 2]
+            candidate = self._best(patch, (region[0] + left, region[1] + top))
+            if candidate is not None and (found is None or candidate[1] > found[1]):
+                found = candidate
+        return found
+
+
+def _contains(region: Box, position: Tuple[int, int], size: Tuple[int, int]) -> bool:
+    return (region[0] <= position[0] and region[1] <= position[1]
+            and position[0] + size[0] <= region[2] and position[1] + size[1] <= region[3])
+
+
+class ImageAnchor:
+    """Locates a target's click point by matching a template near its recorded position.
+
+    The template is centered on the click point; margin is how far (pixels)
+    the target may have moved in any direction. locate() runs on the thread
+    that fires the step, the shared scheduler thread in the app.
+    """
+
+    def __init__(self, template: Image.Image, margin: int = 200, threshold: float = 0.9,
+                 grab: Optional[Grab] = None):
+        self.image = template.convert('L')
+        self.margin = margin
+        self.matcher = TemplateMatcher(self.image, threshold, grab=grab)
+        self.last_match: Optional[Match] = None
+
+    @classmethod
+    def capture(cls, x: int, y: int, size: int = 32, margin: int = 200, threshold: float = 0.9,
+                grab: Optional[Grab] = None) -> 'ImageAnchor':
+        """Take the template from the screen around (x, y)."""
+        half = size // 2
+        template = (grab or grab_screen)((x - half, y - half, x - half + size, y - half + size))
+        return cls(template, margin, threshold, grab)
+
+    def copy(self) -> 'ImageAnchor':
+        """Return an anchor with the same template and settings but no match history."""
+        return ImageAnchor(self.image, self.margin, self.matcher.threshold, self.matcher.grab)
+
+    def locate(self, x: int, y: int) -> Optional[Match]:
+        """Find the click point of a target recorded at (x, y)."""
+        width, height = self.matcher.size
+        left = max(0, x - width // 2 - self.margin)
+        top = max(0, y - height // 2 - self.margin)
+        region = (left, top, x - width // 2 + width + self.margin, y - height // 2 + height + self.margin)
+        self.last_match = self.matcher.find(region)
+        return self.last_match
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert anchor to dictionary for JSON serialization."""
+        buffer = io.BytesIO()
+        self.image.save(buffer, format='PNG')
+        return {
+            'template': base64.b64encode(buffer.getvalue()).decode('ascii'),
+            'margin': self.margin,
+            'threshold': self.matcher.threshold
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], grab: Optional[Grab] = None) -> 'ImageAnchor':
+        """Create an anchor from dictionary data."""
+        image = Image.open(io.BytesIO(base64.b64decode(data['template'])))
+        image.load()
+        return cls(image, data.get('margin', 200), data.get('threshold', 0.9), grab)
+
+
+class ScreenWait:
+    """Condition a step waits for before clicking: a watched region changing or matching a color.
+    
+    The region is grabbed and reduced to a fingerprint of at most cells x cells
+    average colors, so polling costs little regardless of its size. By default
+    it is a size x size box centered on the step's click point. A condition
+    that does not hold within timeout_ms times out.
+    
+    Polls are spaced poll_ms apart, or further when a poll is expensive, so
+    that polling uses at most cpu_budget of one core. Between polls other
+    scripts run, but each grab runs on the scheduler thread and delays
+    steps of other scripts that fall due during it.
+    """
+
+    def __init__(self, mode: str = WAIT_CHANGE, size: int = 1, region: Optional[Box] = None,
+                 color: Optional[Tuple[int, int, int]] = None, tolerance: int = 16, timeout_ms: int = 10000,
+                 poll_ms: float = 10.0, cpu_budget: float = 0.1, cells: int = 8, grab: Optional[Grab] = None):
+        if mode not in WAIT_MODES:
+            raise ValueError(f"unknown wait mode {mode!r}")
+        if mode == WAIT_COLOR and color is None:
+            raise ValueError("a color wait needs a color")
+        self.mode = mode
+        self.size = max(1, size)
+        self.region = tuple(region) if region is not None else None
+        self.color = tuple(color) if color is not None else None
+        self.tolerance = tolerance  # Largest per-channel difference still counted as equal
+        self.timeout_ms = timeout_ms
+        self.poll_ms = poll_ms
+        self.cpu_budget = cpu_budget
+        self.cells = cells
+        self.grab = grab or grab_screen
+
+    def box(self, x: int, y: int) -> Box:
+        """The watched region for a step clicking at (x, y)."""
+        if self.region is not None:
+            return self.region
+        half = self.size // 2
+        return x - half, y - half, x - half + self.size, y - half + self.size
+
+    def fingerprint(self, x: int, y: int) -> np.ndarray:
+        """Grab the watched region and reduce it to a small grid of average colors."""
+        image = self.grab(self.box(x, y)).convert('RGB')
+        width, height = image.size
+        cells = (min(width, self.cells), min(height, self.cells))
+        if cells != image.size:
+            image = image.resize(cells, Image.BOX)
+        return np.asarray(image, dtype=np.int16)
+
+    def satisfied(self, fingerprint: np.ndarray, reference: np.ndarray) -> bool:
+        """Whether the condition holds, given the fingerprint taken when the wait began."""
+        if self.mode == WAIT_COLOR:
+            return int(np.abs(fingerprint - np.array(self.color, dtype=np.int16)).max()) <= self.tolerance
+        return fingerprint.shape != reference.shape or int(np.abs(fingerprint - reference).max()) > self.tolerance
+
+    def poll_interval(self, cost_s: float) -> float:
+        """Seconds until the next poll after one that took cost_s."""
+        interval = self.poll_ms / 1000.0
+        if self.cpu_budget > 0:
+            interval = max(interval, cost_s / self.cpu_budget)
+        return interval
+
+    def copy(self) -> 'ScreenWait':
+        """Return a wait with the same settings."""
+        return ScreenWait.from_dict(self.to_dict(), self.grab)
+
+    def describe(self) -> str:
+        """Short description for the target table."""
+        if self.mode == WAIT_COLOR:
+            return "wait for #{:02x}{:02x}{:02x}".format(*self.color)
+        return "wait for change"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert wait to dictionary for JSON serialization."""
+        return {
+            'mode': self.mode,
+            'size': self.size,
+            'region': list(self.region) if self.region is not None else None,
+            'color': list(self.color) if self.color is not None else None,
+            'tolerance': self.tolerance,
+            'timeout_ms': self.timeout_ms,
+            'poll_ms': self.poll_ms,
+            'cpu_budget': self.cpu_budget,
+            'cells': self.cells
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], grab: Optional[Grab] = None) -> 'ScreenWait':
+        """Create a wait from dictionary data."""
+        return cls(data.get('mode', WAIT_CHANGE), data.get('size', 1), data.get('region'), data.get('color'),
+                   data.get('tolerance', 16), data.get('timeout_ms', 10000), data.get('poll_ms', 10.0),
+                   data.get('cpu_budget', 0.1), data.get('cells', 8), grab)